@@ -0,0 +1,239 @@
+"""
+Benchmark of every route of the API on a seeded sqlite database.
+
+Every route is first called --iterations times through the Flask test client
+(latency of the app alone), then the GET routes are loaded over HTTP by
+--concurrency clients against gunicorn started with gunicorn.conf.py. Requests
+per second and the p50/p95/p99 latency of every route are printed and saved to
+bench/results/<commit>.json, pass an older result file to --compare to see the
+change against that commit.
+
+    $ pipenv run python bench/api.py --people 100000 --users 10000 --favorites 1000000
+    $ pipenv run python bench/api.py --compare bench/results/1a2b3c4.json
+
+The response cache and the catalog snapshots are off unless --cache and
+--snapshot are given, so every request reaches the database.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from async_load import free_port, load, percentile, start_server
+from models import db, User, People, Planet, Vehicle, Favorite
+from utils import encode_cursor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULTS = os.path.join(ROOT, 'bench', 'results')
+BATCH = 10000
+
+
+def rows(model, count, make):
+    return ({field: f'{field} {number}' for field in model.required_fields} | make(number) for number in range(count))
+
+
+def new_row(model, number):
+    return {field: f'new {field} {number}' for field in model.required_fields}
+
+
+def insert_all(table, values):
+    from sqlalchemy import insert
+    batch = []
+    for value in values:
+        batch.append(value)
+        if len(batch) == BATCH:
+            db.session.execute(insert(table), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+
+
+def seed(app, args):
+    with app.app_context():
+        db.create_all()
+        insert_all(People, rows(People, args.people, lambda number: {'name': f'Person {number}',
+                                                                         'gender': ('male', 'female', 'n/a')[number % 3]}))
+        insert_all(Planet, rows(Planet, args.planets, lambda number: {'name': f'Planet {number}'}))
+        insert_all(Vehicle, rows(Vehicle, args.vehicles, lambda number: {'name': f'Vehicle {number}'}))
+        insert_all(User, ({'username': f'user{number}', 'fullname': f'User {number}', 'email': f'user{number}@example.com',
+                               'password': 'password', 'is_active': True} for number in range(args.users)))
+        insert_all(Favorite.__table__, favorites(args))
+        # the raw inserts skip the counters, /popular would rank nothing
+        from commands import COUNTED, reconcile_favorite_counts
+        for model, key_column, favorite_column in COUNTED.values():
+            reconcile_favorite_counts(model, key_column, favorite_column)
+        db.session.commit()
+
+
+def favorites(args):
+    # every user except the last one gets favorites, the last one is left empty
+    # for the routes that add and remove favorites
+    users = args.users - 1
+    counts = {'people_id': args.people, 'planet_id': args.planets, 'vehicle_id': args.vehicles}
+    created = 0
+    for number in range(args.favorites * 3):
+        if created == args.favorites:
+            return
+        column = ('people_id', 'planet_id', 'vehicle_id')[number % 3]
+        user_id, item_id = number // 3 % users + 1, number // 3 // users + 1
+        if item_id <= counts[column]:
+            created += 1
+            yield {'user_id': user_id, 'people_id': None, 'planet_id': None, 'vehicle_id': None, column: item_id}
+
+
+def routes(args):
+    """(name, method, request) for every route, request(number) gives the path and the JSON body."""
+    user = args.users
+    middle = encode_cursor(args.people // 2)
+    return [
+        ('GET /', 'GET', lambda number: ('/', None)),
+        ('GET /health/db', 'GET', lambda number: ('/health/db', None)),
+        ('GET /users', 'GET', lambda number: ('/users', None)),
+        ('GET /users/<id>', 'GET', lambda number: (f'/users/{number % user + 1}', None)),
+        ('GET /users/favorites/<id>', 'GET', lambda number: (f'/users/favorites/{number % (user - 1) + 1}', None)),
+        ('GET /users/favorites/<id>?expand=1', 'GET', lambda number: (f'/users/favorites/{number % (user - 1) + 1}?expand=1', None)),
+        ('GET /people', 'GET', lambda number: ('/people', None)),
+        ('GET /people?limit=500', 'GET', lambda number: ('/people?limit=500', None)),
+        ('GET /people?after=<middle>', 'GET', lambda number: (f'/people?after={middle}', None)),
+        ('GET /people?gender=female&sort=-name', 'GET', lambda number: ('/people?gender=female&sort=-name', None)),
+        ('GET /people?fields=id,name', 'GET', lambda number: ('/people?fields=id,name', None)),
+        ('GET /people?ids=<100 ids>', 'GET', lambda number: ('/people?ids=' + ','.join(
+            str((number + item * 97) % args.people + 1) for item in range(100)), None)),
+        ('GET /people/<id>', 'GET', lambda number: (f'/people/{number % args.people + 1}', None)),
+        ('GET /planets', 'GET', lambda number: ('/planets', None)),
+        ('GET /planets/<id>', 'GET', lambda number: (f'/planets/{number % args.planets + 1}', None)),
+        ('GET /vehicles', 'GET', lambda number: ('/vehicles', None)),
+        ('GET /vehicles/<id>', 'GET', lambda number: (f'/vehicles/{number % args.vehicles + 1}', None)),
+        ('GET /search?q=person 12', 'GET', lambda number: ('/search?q=person%2012', None)),
+        ('GET /popular', 'GET', lambda number: ('/popular', None)),
+        # the favorites of the last user are added, then removed again
+        ('POST /favorites/<user>/people/<id>', 'POST', lambda number: (f'/favorites/{user}/people/{number % args.people + 1}', None)),
+        ('DELETE /favorites/<user>/people/<id>', 'DELETE', lambda number: (f'/favorites/{user}/people/{number % args.people + 1}', None)),
+        ('POST /favorites/<user>/planets/<id>', 'POST', lambda number: (f'/favorites/{user}/planets/{number % args.planets + 1}', None)),
+        ('DELETE /favorites/<user>/planets/<id>', 'DELETE', lambda number: (f'/favorites/{user}/planets/{number % args.planets + 1}', None)),
+        ('POST /favorites/<user>/vehicles/<id>', 'POST', lambda number: (f'/favorites/{user}/vehicles/{number % args.vehicles + 1}', None)),
+        ('DELETE /favorites/<user>/vehicles/<id>', 'DELETE', lambda number: (f'/favorites/{user}/vehicles/{number % args.vehicles + 1}', None)),
+        ('POST /favorites/<user>/batch', 'POST', lambda number: (f'/favorites/{user}/batch', [
+            {'kind': 'people', 'id': item, 'op': ('add', 'remove')[number % 2]} for item in range(1, 11)])),
+        ('POST /people', 'POST', lambda number: ('/people', new_row(People, number))),
+        ('POST /people/bulk', 'POST', lambda number: ('/people/bulk', [new_row(People, f'bulk {number} {item}') for item in range(100)])),
+        ('POST /planets', 'POST', lambda number: ('/planets', new_row(Planet, number))),
+        ('POST /planets/bulk', 'POST', lambda number: ('/planets/bulk', [new_row(Planet, f'bulk {number} {item}') for item in range(100)])),
+        ('POST /vehicles', 'POST', lambda number: ('/vehicles', new_row(Vehicle, number))),
+        ('POST /vehicles/bulk', 'POST', lambda number: ('/vehicles/bulk', [new_row(Vehicle, f'bulk {number} {item}') for item in range(100)])),
+    ]
+
+
+def measure(client, method, request, iterations):
+    latencies = []
+    statuses = set()
+    start = time.perf_counter()
+    for number in range(iterations):
+        path, body = request(number)
+        began = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        latencies.append(time.perf_counter() - began)
+        statuses.add(response.status_code)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'rps': iterations / elapsed, 'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99), 'status': sorted(statuses)}
+
+
+def report(title, results, baseline):
+    print(f'\n{title}')
+    print(f'{"route":<42}{"req/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+    for name, result in results.items():
+        line = f'{name:<42}{result["rps"]:10.0f}{result["p50"]:9.2f}{result["p95"]:9.2f}{result["p99"]:9.2f}'
+        if name in baseline:
+            line += f'   p95 {result["p95"] / baseline[name]["p95"]:5.2f}x the baseline'
+        if any(status >= 400 for status in result.get('status', ())):
+            line += f'   status {result["status"]}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--people', type=int, default=10000)
+    parser.add_argument('--planets', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--favorites', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000, help='HTTP requests per route')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--skip-http', action='store_true')
+    parser.add_argument('--cache', action='store_true')
+    parser.add_argument('--snapshot', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    if args.cache:
+        os.environ.setdefault('CACHE_URL', 'local')
+    else:
+        os.environ['CACHE_URL'] = 'none'
+    os.environ['CATALOG_SNAPSHOT'] = '1' if args.snapshot else '0'
+
+    from app import app
+
+    start = time.perf_counter()
+    seed(app, args)
+    print(f'seeded {args.people} people, {args.planets} planets, {args.vehicles} vehicles, {args.users} users '
+          f'and {args.favorites} favorites in {time.perf_counter() - start:.1f}s')
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    # warn about the routes added to the app but not to the table above
+    table = routes(args)
+    route_path = lambda path: re.sub(r'<[^>]*>', '<>', path.split('?')[0])
+    covered = {(method, route_path(name.split()[1])) for name, method, _ in table}
+    for rule in app.url_map.iter_rules():
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if not rule.rule.startswith(('/admin', '/static', '/metrics')) and (method, route_path(rule.rule)) not in covered:
+                print(f'not benchmarked: {method} {rule.rule}')
+
+    client = app.test_client()
+    results = {'client': {}, 'http': {}}
+    for name, method, request in table:
+        results['client'][name] = measure(client, method, request, args.iterations)
+    report('Flask test client', results['client'], baseline.get('client', {}))
+
+    if not args.skip_http:
+        port = free_port()
+        # workers aren't recycled during the run, that would close the client connections
+        env = dict(os.environ, GUNICORN_MAX_REQUESTS='0')
+        server = start_server('sync', port, args.workers, env, ['--config', os.path.join(ROOT, 'gunicorn.conf.py')])
+        try:
+            for name, method, request in table:
+                if method == 'GET':
+                    results['http'][name] = load(port, request(0)[0].replace(' ', '%20'), args.concurrency, args.requests)
+        finally:
+            server.terminate()
+            server.wait()
+        report(f'HTTP, {args.concurrency} clients, {args.workers} gunicorn workers', results['http'],
+               baseline.get('http', {}))
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    results.update(commit=commit, date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                   volumes={name: getattr(args, name) for name in ('people', 'planets', 'vehicles', 'users', 'favorites')})
+    output = args.output or os.path.join(RESULTS, f'{commit or "results"}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'\nsaved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Load test of the sync deployment (gunicorn sync workers, wsgi.py) against the
+async one (gunicorn gevent workers, wsgi_async.py). Both are started with the
+same number of workers on the same database, then hit by --concurrency clients
+at once; requests per second and the p50/p99 latency are reported for each.
+
+The difference shows when the requests wait on the database, so point
+--database-url to postgres for meaningful numbers. sqlite calls can't be
+interrupted by gevent and run one after the other in both modes. The response
+cache and the catalog snapshots are off so every request reaches the database,
+--snapshot turns the snapshots on.
+
+    $ pipenv run python bench/async_load.py --database-url postgresql://... --concurrency 50
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+MODES = {
+    'sync': ['wsgi'],
+    'gevent': ['wsgi_async', '-k', 'gevent', '--worker-connections', '1000'],
+}
+
+
+def seed(database_url, rows):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('CACHE_URL', 'none')
+    from sqlalchemy import insert
+    from app import app, db
+    from models import People
+
+    with app.app_context():
+        db.create_all()
+        missing = rows - People.query.count()
+        fields = {field: 'value ' + field for field in People.required_fields}
+        if missing > 0:
+            db.session.execute(insert(People), [dict(fields, name=f'name {number}') for number in range(missing)])
+            db.session.commit()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers, env, options=()):
+    command = [sys.executable, '-m', 'gunicorn', *MODES[mode], '--chdir', SRC, '--workers', str(workers),
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', *options]
+    # started from src/ so gunicorn doesn't pick up the production gunicorn.conf.py
+    server = subprocess.Popen(command, env=env, cwd=SRC)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f'gunicorn ({mode}) did not start')
+
+
+def percentile(latencies, fraction):
+    """Latency in ms below which the given fraction of the sorted latencies (in seconds) fall."""
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+
+def load(port, path, concurrency, requests):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_client = requests // concurrency
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        for _ in range(per_client):
+            start = time.perf_counter()
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status != 200:
+                    errors.append(response.status)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--path', default='/people?limit=100')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'gevent'])
+    parser.add_argument('--snapshot', action='store_true', help='serve the catalog from the in-memory snapshots')
+    args = parser.parse_args()
+
+    seed(args.database_url, args.rows)
+    env = dict(os.environ, DATABASE_URL=args.database_url, CACHE_URL='none', CATALOG_SNAPSHOT='1' if args.snapshot else '0')
+    for mode in args.modes:
+        port = free_port()
+        server = start_server(mode, port, args.workers, env)
+        try:
+            load(port, args.path, args.concurrency, min(args.requests, 200))  # warm up
+            result = load(port, args.path, args.concurrency, args.requests)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{mode:>7}: {result["rps"]:8.0f} req/s  p50 {result["p50"]:7.1f} ms  '
+              f'p99 {result["p99"]:7.1f} ms  errors {result["errors"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Measures favorite lookups (the queries behind the /favorites endpoints) on a
+big Favorite table stored in a temporary sqlite database, first without and
+then with the indexes declared on the Favorite model.
+
+    $ pipenv run python bench/favorites_index.py --favorites 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import create_engine, insert, select
+from models import Favorite
+
+KINDS = ('people_id', 'planet_id', 'vehicle_id')
+
+
+def seed(engine, favorites, users, items):
+    rng = random.Random(42)
+    seen = set()
+    batch = []
+    with engine.begin() as conn:
+        while len(seen) < favorites:
+            user_id = rng.randint(1, users)
+            kind = rng.choice(KINDS)
+            item_id = rng.randint(1, items)
+            if (user_id, kind, item_id) in seen:
+                continue
+            seen.add((user_id, kind, item_id))
+            batch.append({'user_id': user_id, 'people_id': None, 'planet_id': None, 'vehicle_id': None, kind: item_id})
+            if len(batch) == 10000:
+                conn.execute(insert(Favorite.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Favorite.__table__), batch)
+
+
+def timed_lookups(engine, lookups, users, items):
+    rng = random.Random(7)
+    table = Favorite.__table__
+    timings = []
+    with engine.connect() as conn:
+        for _ in range(lookups):
+            user_id = rng.randint(1, users)
+            column = table.c[rng.choice(KINDS)]
+            query = select(table.c.favoriteID).where(table.c.user_id == user_id, column == rng.randint(1, items))
+            start = time.perf_counter()
+            conn.execute(query).first()
+            conn.execute(select(table.c.favoriteID).where(table.c.user_id == user_id)).all()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'p50_ms': timings[len(timings) // 2] * 1000,
+        'p99_ms': timings[int(len(timings) * 0.99)] * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--favorites', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    table = Favorite.__table__
+    # only the favorite table matters here (sqlite does not enforce the foreign
+    # keys), create it without its indexes
+    table.create(engine)
+    for index in table.indexes:
+        index.drop(engine)
+
+    start = time.perf_counter()
+    seed(engine, args.favorites, args.users, args.items)
+    print(f'seeded {args.favorites} favorites in {time.perf_counter() - start:.1f}s')
+
+    before = timed_lookups(engine, args.lookups, args.users, args.items)
+    start = time.perf_counter()
+    for index in table.indexes:
+        index.create(engine)
+    print(f'created indexes in {time.perf_counter() - start:.1f}s')
+    after = timed_lookups(engine, args.lookups, args.users, args.items)
+
+    for name, result in (('without indexes', before), ('with indexes', after)):
+        print(f"{name:>16}: p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  mean {result['mean_ms']:.3f} ms")
+    table.drop(engine)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares reading a page of People the ORM way (full People instances, then their
+serialized values) with the Core SELECT of just the serialized columns that the
+list endpoints use, and reports rows per second for both. The last line is the
+full GET /people request through the Flask test client.
+
+    $ pipenv run python bench/read_path.py --rows 100000 --page 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('CACHE_URL', 'none')
+
+from sqlalchemy import insert, select
+from app import app, db
+from models import People
+from serializer import Rows
+
+
+def rows_per_second(pages, page, function):
+    start = time.perf_counter()
+    for number in range(pages):
+        function(number * page)
+    return pages * page / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page', type=int, default=500)
+    parser.add_argument('--pages', type=int, default=100)
+    args = parser.parse_args()
+    pages = min(args.pages, args.rows // args.page)
+
+    with app.app_context():
+        db.create_all()
+        fields = {field: 'value ' + field for field in People.required_fields}
+        for start in range(0, args.rows, 10000):
+            db.session.execute(insert(People), [dict(fields, name=f'name {number}')
+                                                for number in range(start, min(start + 10000, args.rows))])
+        db.session.commit()
+        keys = People.serialized_keys()
+        attributes = [People.serialized_fields[key] for key in keys]
+        columns = [getattr(People, attribute) for attribute in attributes]
+
+        def orm(after):
+            rows = People.query.filter(People.peopleID > after).order_by(People.peopleID).limit(args.page).all()
+            Rows(keys, [tuple(getattr(row, attribute) for attribute in attributes) for row in rows]).encode()
+            db.session.expunge_all()
+
+        def core(after):
+            rows = db.session.execute(select(*columns).where(People.peopleID > after)
+                                      .order_by(People.peopleID).limit(args.page)).all()
+            Rows(keys, rows).encode()
+
+        results = {'orm': rows_per_second(pages, args.page, orm), 'core': rows_per_second(pages, args.page, core)}
+
+    client = app.test_client()
+    results['GET /people'] = rows_per_second(pages, args.page, lambda after: client.get(
+        '/people', query_string={'limit': args.page}))
+
+    for name, rate in results.items():
+        print(f'{name:>11}: {rate:10.0f} rows/s  ({rate / results["orm"]:4.1f}x the ORM path)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Times /search queries on growing tables to check that the latency depends on
+the number of matches and not on the size of the tables. Every size is loaded
+into a new temporary sqlite database (FTS5 index) and compared with a plain
+LIKE '%term%' scan over the same rows.
+
+    $ pipenv run python bench/search.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+WORDS = ['sky', 'walker', 'star', 'destroyer', 'death', 'dune', 'sea', 'cloud', 'city', 'fighter',
+         'storm', 'trooper', 'rebel', 'base', 'moon', 'ice', 'fire', 'shadow', 'speeder', 'bike']
+TERMS = ['skywalker-0', 'storm', 'ice moon', 'zzz']
+
+
+def names(count, rng):
+    for number in range(count):
+        yield '{} {}{}-{}'.format(rng.choice(WORDS).title(), rng.choice(WORDS), rng.choice(WORDS), number)
+
+
+def run(size, lookups):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    for module in ('app', 'admin', 'cache', 'search', 'models'):
+        sys.modules.pop(module, None)
+    from sqlalchemy import insert, text
+    from app import app, db
+    from models import People
+
+    rng = random.Random(size)
+    fields = {field: 'x' for field in People.required_fields}
+    with app.app_context():
+        db.create_all()
+        batch = []
+        for name in names(size, rng):
+            batch.append(dict(fields, name=name))
+            if len(batch) == 10000:
+                db.session.execute(insert(People), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(People), batch)
+        db.session.commit()
+
+        client = app.test_client()
+        for term in TERMS:
+            timings = []
+            for _ in range(lookups):
+                start = time.perf_counter()
+                client.get('/search', query_string={'q': term, 'limit': 20})
+                timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            db.session.execute(text('SELECT "peopleID", name FROM people WHERE name LIKE :p LIMIT 20'),
+                               {'p': '%' + term.split()[0] + '%'}).all()
+            scan = time.perf_counter() - start
+            timings.sort()
+            print(f'{size:>9} rows  q={term!r:<14} /search p50 {timings[len(timings) // 2] * 1000:7.2f} ms'
+                  f'   LIKE scan {scan * 1000:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--lookups', type=int, default=50)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares the time to turn a page of People rows into a JSON body:
+
+- jsonify: serialize() every row into a dict, then flask.jsonify the list (the old path)
+- rows/json: serializer.Rows over the same rows as tuples, standard library encoder
+- rows/orjson: serializer.Rows over the same rows as tuples, orjson (when it is installed)
+
+    $ pipenv run python bench/serializer.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from flask import jsonify
+from sqlalchemy import insert, select
+from app import app, db
+from models import People
+import serializer
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        fields = {field: 'value ' + field for field in People.required_fields}
+        db.session.execute(insert(People), [dict(fields, name=f'name {number}') for number in range(args.rows)])
+        db.session.commit()
+        rows = People.query.all()
+        keys = People.serialized_keys()
+        tuples = db.session.execute(select(*[getattr(People, People.serialized_fields[key]) for key in keys])).all()
+
+        def old_path():
+            return jsonify(list(map(lambda item: item.serialize(), rows))).get_data()
+
+        def rows_path():
+            return serializer.Rows(keys, tuples).encode()
+
+        results = {'jsonify': best_of(args.repeat, old_path)}
+        orjson = serializer.orjson
+        serializer.orjson = None
+        results['rows/json'] = best_of(args.repeat, rows_path)
+        serializer.orjson = orjson
+        if orjson is not None:
+            results['rows/orjson'] = best_of(args.repeat, rows_path)
+
+    baseline = results['jsonify']
+    for name, seconds in results.items():
+        print(f'{name:>12}: {seconds * 1000:8.2f} ms for {args.rows} rows  ({baseline / seconds:4.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Memory per row of the in-memory catalog snapshot compared with the same People
+rows loaded as ORM instances, measured with tracemalloc, followed by the time of
+GET /people/<id> from the snapshot and from the database.
+
+    $ pipenv run python bench/snapshot.py --rows 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('CACHE_URL', 'none')
+
+from sqlalchemy import insert
+from app import app, db
+from models import People
+from snapshot import Catalog
+
+
+def allocated(function):
+    """Bytes still allocated by the result of function, and the result."""
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+    app.config['SNAPSHOT_MAX_ROWS'] = args.rows
+
+    with app.app_context():
+        db.create_all()
+        fields = {field: 'value ' + field for field in People.required_fields}
+        for start in range(0, args.rows, 10000):
+            db.session.execute(insert(People), [dict(fields, name=f'name {number}')
+                                                for number in range(start, min(start + 10000, args.rows))])
+        db.session.commit()
+
+        orm_size, instances = allocated(lambda: People.query.all())
+        del instances
+        db.session.expunge_all()
+        catalog = Catalog(People, People.peopleID, 'people')
+        snapshot_size, snapshot = allocated(catalog.get)
+        print(f'ORM instances: {orm_size / args.rows:8.0f} bytes per row')
+        print(f'snapshot:      {snapshot_size / args.rows:8.0f} bytes per row  '
+              f'({orm_size / snapshot_size:.1f}x smaller, {len(snapshot.rows)} rows)')
+
+    client = app.test_client()
+    for enabled in (False, True):
+        app.config['CATALOG_SNAPSHOT'] = enabled
+        client.get('/people/1')
+        start = time.perf_counter()
+        for number in range(args.lookups):
+            client.get(f'/people/{number % args.rows + 1}')
+        rate = args.lookups / (time.perf_counter() - start)
+        print(f'GET /people/<id> from the {"snapshot" if enabled else "database"}: {rate:8.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
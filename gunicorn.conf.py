@@ -0,0 +1,68 @@
+# gunicorn settings for the production server (Procfile and render.yaml):
+#
+#   $ gunicorn -c gunicorn.conf.py wsgi --chdir ./src/
+#
+# Every setting can be changed with an environment variable:
+#
+#   WEB_CONCURRENCY          worker processes (default: 2 * usable CPUs + 1, at most 4)
+#   GUNICORN_THREADS         threads per worker (default 2, 1 uses sync workers)
+#   GUNICORN_TIMEOUT         seconds before a silent worker is restarted (default 30)
+#   GUNICORN_KEEPALIVE       seconds a keep-alive connection waits for the next request (default 5)
+#   GUNICORN_MAX_REQUESTS    requests before a worker is replaced, 0 to disable (default 1000)
+#   PROMETHEUS_MULTIPROC_DIR where the workers write their metrics (default: a new temporary directory)
+#
+# Every worker opens its own database pool: keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the connection limit of the database.
+# Every worker also keeps its own response cache and catalog snapshots, so the
+# default stays small; set WEB_CONCURRENCY on bigger instances.
+
+import os
+import sys
+import tempfile
+
+MAX_DEFAULT_WORKERS = 4
+
+
+def usable_cpus():
+    # the CPUs this process may run on, cpu_count() counts every CPU of the host
+    # in a container
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+workers = int(os.getenv('WEB_CONCURRENCY', min(usable_cpus() * 2 + 1, MAX_DEFAULT_WORKERS)))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# replace the workers from time to time so memory can't grow for ever, the jitter
+# keeps them from restarting all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# must be set before the app (and prometheus_client) is imported, see src/metrics.py
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='prometheus-'))
+
+# import the app and the models once in the master, the workers get them on fork
+preload_app = True
+
+
+def post_fork(server, worker):
+    # connections opened by the master before the fork would be shared by every
+    # worker: drop them from the pool (without closing the master's sockets) so
+    # every worker opens its own
+    app_module = sys.modules.get('app')
+    if app_module is None:
+        return
+    with app_module.app.app_context():
+        app_module.db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    metrics_module = sys.modules.get('metrics')
+    if metrics_module is not None:
+        metrics_module.worker_exit(worker.pid)
@@ -38,6 +38,17 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_name(name, type_, parent_names):
+    # the full text search objects (src/search.py) are created with raw SQL and
+    # aren't in the models, autogenerate must not drop them: the FTS5 table and
+    # its shadow tables on sqlite, the trigram indexes on postgres
+    if type_ == 'table':
+        return not name.startswith('search_index')
+    if type_ == 'index':
+        return not name.endswith('_name_trgm')
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -52,7 +63,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -84,6 +96,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_name=include_name,
             **current_app.extensions['migrate'].configure_args
         )
 
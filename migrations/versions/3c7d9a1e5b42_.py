@@ -0,0 +1,42 @@
+"""favorite lookup indexes and unique favorites per user
+
+Revision ID: 3c7d9a1e5b42
+Revises: b564612ee2ae
+Create Date: 2026-10-18 10:41:12.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7d9a1e5b42'
+down_revision = 'b564612ee2ae'
+branch_labels = None
+depends_on = None
+
+KINDS = ('people', 'planet', 'vehicle')
+
+
+def upgrade():
+    # the old endpoints could store the same favorite twice, keep the oldest
+    # copy so the unique indexes below can be built
+    for kind in KINDS:
+        op.execute(sa.text(
+            'DELETE FROM favorite WHERE {0}_id IS NOT NULL AND "favoriteID" NOT IN ('
+            'SELECT MIN("favoriteID") FROM favorite WHERE {0}_id IS NOT NULL '
+            'GROUP BY user_id, {0}_id)'.format(kind)))
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_user_id', ['user_id'], unique=False)
+        for kind in KINDS:
+            where = sa.text('{0}_id IS NOT NULL'.format(kind))
+            batch_op.create_index('uq_favorite_user_{0}'.format(kind), ['user_id', '{0}_id'.format(kind)], unique=True,
+                                  postgresql_where=where, sqlite_where=where)
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        for kind in reversed(KINDS):
+            batch_op.drop_index('uq_favorite_user_{0}'.format(kind))
+        batch_op.drop_index('ix_favorite_user_id')
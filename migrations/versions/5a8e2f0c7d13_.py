@@ -0,0 +1,41 @@
+"""indexes for the list endpoint filters
+
+Revision ID: 5a8e2f0c7d13
+Revises: 3c7d9a1e5b42
+Create Date: 2026-10-18 11:02:47.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a8e2f0c7d13'
+down_revision = '3c7d9a1e5b42'
+branch_labels = None
+depends_on = None
+
+# every index ends with the primary key so filtered pages keep using keyset pagination
+INDEXES = {
+    'people': [('ix_people_gender', ['gender', 'peopleID']),
+               ('ix_people_homeworld', ['homeworld', 'peopleID'])],
+    'planet': [('ix_planet_climate', ['climate', 'planetID']),
+               ('ix_planet_terrain', ['terrain', 'planetID'])],
+    'vehicle': [('ix_vehicle_name', ['name', 'vehicleID']),
+                ('ix_vehicle_manufacturer', ['manufacturer', 'vehicleID']),
+                ('ix_vehicle_vehicle_class', ['vehicle_class', 'vehicleID'])],
+}
+
+
+def upgrade():
+    for table, indexes in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, columns in indexes:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, indexes in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, _ in reversed(indexes):
+                batch_op.drop_index(name)
@@ -0,0 +1,60 @@
+"""name search indexes
+
+Revision ID: 7b1f4c9d2e60
+Revises: 5a8e2f0c7d13
+Create Date: 2026-10-18 11:31:05.114870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1f4c9d2e60'
+down_revision = '5a8e2f0c7d13'
+branch_labels = None
+depends_on = None
+
+# table, primary key, kind returned by /search, number used to build the FTS rowid
+SEARCHABLE = (
+    ('people', 'peopleID', 'people', 1),
+    ('planet', 'planetID', 'planets', 2),
+    ('vehicle', 'vehicleID', 'vehicles', 3),
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, _, _, _ in SEARCHABLE:
+            op.execute('CREATE INDEX ix_{0}_name_trgm ON {0} USING gin (name gin_trgm_ops)'.format(table))
+    elif dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE search_index USING fts5(name, kind UNINDEXED, ref_id UNINDEXED)')
+        for table, key, kind, number in SEARCHABLE:
+            rowid = '{{0}}."{}" * 4 + {}'.format(key, number)
+            op.execute(
+                "INSERT INTO search_index(rowid, name, kind, ref_id) "
+                "SELECT {0}, name, '{1}', \"{2}\" FROM {3}".format(rowid.format(table), kind, key, table))
+            op.execute(
+                "CREATE TRIGGER {0}_search_insert AFTER INSERT ON {0} BEGIN "
+                "INSERT INTO search_index(rowid, name, kind, ref_id) VALUES ({1}, new.name, '{2}', new.\"{3}\"); END"
+                .format(table, rowid.format('new'), kind, key))
+            op.execute(
+                "CREATE TRIGGER {0}_search_update AFTER UPDATE OF name ON {0} BEGIN "
+                "UPDATE search_index SET name = new.name WHERE rowid = {1}; END".format(table, rowid.format('new')))
+            op.execute(
+                "CREATE TRIGGER {0}_search_delete AFTER DELETE ON {0} BEGIN "
+                "DELETE FROM search_index WHERE rowid = {1}; END".format(table, rowid.format('old')))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, _, _, _ in SEARCHABLE:
+            op.execute('DROP INDEX ix_{0}_name_trgm'.format(table))
+    elif dialect == 'sqlite':
+        for table, _, _, _ in SEARCHABLE:
+            for action in ('insert', 'update', 'delete'):
+                op.execute('DROP TRIGGER {0}_search_{1}'.format(table, action))
+        op.execute('DROP TABLE search_index')
@@ -0,0 +1,39 @@
+"""favorite counters on people, planet and vehicle
+
+Revision ID: 9d2c6a4f1b37
+Revises: 7b1f4c9d2e60
+Create Date: 2026-10-18 12:06:41.208337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2c6a4f1b37'
+down_revision = '7b1f4c9d2e60'
+branch_labels = None
+depends_on = None
+
+# table, primary key, column of favorite pointing to the table
+COUNTED = (
+    ('people', 'peopleID', 'people_id'),
+    ('planet', 'planetID', 'planet_id'),
+    ('vehicle', 'vehicleID', 'vehicle_id'),
+)
+
+
+# plain ALTER TABLE instead of batch_alter_table: on sqlite a batch copies the
+# table, which would drop the search triggers (sqlite 3.35+ can drop columns)
+def upgrade():
+    for table, key, column in COUNTED:
+        op.add_column(table, sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute('UPDATE {0} SET favorite_count = (SELECT count(*) FROM favorite WHERE favorite.{2} = {0}."{1}")'
+                   .format(table, key, column))
+        op.create_index('ix_{}_favorite_count'.format(table), table, ['favorite_count', key], unique=False)
+
+
+def downgrade():
+    for table, _, _ in COUNTED:
+        op.drop_index('ix_{}_favorite_count'.format(table), table_name=table)
+        op.drop_column(table, 'favorite_count')
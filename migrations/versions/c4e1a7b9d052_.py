@@ -0,0 +1,29 @@
+"""updated date on people, planet and vehicle
+
+Revision ID: c4e1a7b9d052
+Revises: 9d2c6a4f1b37
+Create Date: 2026-10-18 15:42:10.517204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a7b9d052'
+down_revision = '9d2c6a4f1b37'
+branch_labels = None
+depends_on = None
+
+TABLES = ('people', 'planet', 'vehicle')
+
+
+# plain ALTER TABLE, a batch would drop the search triggers on sqlite
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'updated')
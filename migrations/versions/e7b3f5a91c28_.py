@@ -0,0 +1,24 @@
+"""updated date on user
+
+Revision ID: e7b3f5a91c28
+Revises: c4e1a7b9d052
+Create Date: 2026-10-18 16:20:37.084412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f5a91c28'
+down_revision = 'c4e1a7b9d052'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('updated', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user', 'updated')
@@ -2,14 +2,28 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, request, url_for
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from utils import APIException, generate_sitemap, add_validators, collection_response, get_bulk_rows, get_fields, load_fields, \
+    get_page_size, encode_cursor, decode_cursor, page_response
 from admin import setup_admin
+from commands import setup_commands
+from cache import setup_cache, cached
+from compression import setup_compression, compress_response
+from search import search
+from snapshot import setup_snapshots, get_snapshot, catalog_response, snapshot_db_version
+from conditional import setup_conditional, conditional, catalog_version, table_version, remember_etag
+from serializer import Rows, json_response
+from database import engine_options, pool_status
+from instrumentation import setup_instrumentation
+from metrics import setup_metrics
 from models import db, User,People,Vehicle,Favorite,Planet
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, insert, or_, select, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload
+import time
 #from models import Person
 
 app = Flask(__name__)
@@ -21,16 +35,31 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['BULK_MAX_ROWS'] = int(os.getenv("BULK_MAX_ROWS", 5000))
 
 MIGRATE = Migrate(app, db)
 db.init_app(app)
 CORS(app)
 setup_admin(app)
+setup_commands(app)
+setup_cache(app)
+setup_compression(app)
+setup_snapshots(app)
+setup_conditional(app)
+setup_instrumentation(app)
+setup_metrics(app)
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
 def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code
+    return json_response(error.to_dict()), error.status_code
+
+@app.after_request
+def add_cache_validators(response):
+    # compressed first: every encoding gets its own ETag, which the conditional
+    # request is compared with
+    return remember_etag(add_validators(compress_response(response)))
 
 
 """ ENDPOINTS """
@@ -40,26 +69,41 @@ def handle_invalid_usage(error):
 def sitemap():
     return generate_sitemap(app)
 
+@app.route('/health/db',methods=['GET'])
+def get_db_health():
+    status = {"pool": pool_status(db.engine)}
+    try:
+        start = time.perf_counter()
+        db.session.execute(text('SELECT 1'))
+        status["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        status["status"] = "ok"
+        code = 200
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        status["status"] = "error"
+        status["msg"] = str(err)
+        code = 503
+    response = json_response(status)
+    response.headers['Cache-Control'] = 'no-store'
+    return response,code
+
 
 """ USER ENDPOINT """
 
 @app.route('/users', methods=['GET'])
+@conditional(table_version(User, User.id))
 def get_all_users():
-    query_users = db.session.query(User).all()
-    try:
-        if query_users == None:
-            return jsonify({"msg":"There are no users registered yet"}),404
-        else:
-            result = list((map(lambda item:item.serialize(),query_users)))
-            return jsonify(result),200
-    except Exception as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500        
+    return collection_response(User, User.id),200
 
 @app.route('/users/<int:id_user>',methods=['GET'])
+@conditional(table_version(User, User.id))
 def get_specific_user(id_user):
-    query_user = db.session.query(User).get_or_404(id_user,f'Sorry there is no user with id "{id}" registered')
-    result = query_user.serialize()
-    return jsonify(result),200
+    fields = get_fields(User)
+    query_user = load_fields(db.session.query(User), User, fields).get_or_404(id_user,f'Sorry there is no user with id "{id_user}" registered')
+    result = query_user.serialize(fields)
+    response = json_response(result)
+    response.last_modified = query_user.last_modified
+    return response,200
  
 
 
@@ -69,66 +113,86 @@ def get_specific_user(id_user):
 
 @app.route('/users/favorites/<int:id_user>',methods=['GET'])
 def get_user_favorites(id_user):
+    if request.args.get('expand', '').lower() in ('1', 'true'):
+        return get_user_favorites_expanded(id_user)
     query_favorites = db.session.query(Favorite).filter_by(user_id=id_user).all()
     try:
         if query_favorites is None:
-            return jsonify({"msg":"This user has no favorties"}),404
+            return json_response({"msg":"This user has no favorties"}),404
         else:
             result = list(map(lambda item: item.serialize(),query_favorites))
-            return jsonify(result),200
+            return json_response(result),200
 
     except Exception as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
+
+def get_user_favorites_expanded(id_user):
+    # one query: the favorites and the rows they point to come back together
+    # through LEFT OUTER JOINs instead of one request per favorite
+    query_favorites = db.session.query(Favorite).options(
+        joinedload(Favorite.people),
+        joinedload(Favorite.planet),
+        joinedload(Favorite.vehicle),
+    ).filter_by(user_id=id_user).order_by(Favorite.favoriteID).all()
+    try:
+        result = {"people":[],"planets":[],"vehicles":[]}
+        for favorite in query_favorites:
+            if favorite.people is not None:
+                result["people"].append(favorite.people.serialize())
+            elif favorite.planet is not None:
+                result["planets"].append(favorite.planet.serialize())
+            elif favorite.vehicle is not None:
+                result["vehicles"].append(favorite.vehicle.serialize())
+        return json_response(result),200
+    except Exception as err:
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
 
 @app.route('/favorites/<int:id_user>/planets/<int:id_planet>',methods=['POST'])
 def post_user_favorite_planet(id_user,id_planet):
     db.session.query(User).get_or_404(id_user,f'There is no user with id "{id_user}"')
     db.session.query(Planet).get_or_404(id_planet,f'There is no Planet with id "{id_planet}"')
+    # duplicates are rejected by the uq_favorite_user_planet index
     try:
-        query_favorite = db.session.query(Favorite).filter_by(user_id = id_user, planet_id = id_planet).first()
-        if query_favorite is not None:
-            return jsonify({"msg":"This Planet has been already added to favorites"}),404
-        else:
-            favorite = Favorite(vehicle_id=None, people_id=None, planet_id = id_planet, user_id =id_user)
+        favorite = Favorite(vehicle_id=None, people_id=None, planet_id = id_planet, user_id =id_user)
         db.session.add(favorite)
+        update_favorite_counts("planets", {id_planet: 1})
         db.session.commit()
-        return jsonify({"msg":"Done"}),201            
-    except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)})
+        return json_response({"msg":"Done"}),201
+    except IntegrityError:
+        db.session.rollback()
+        return json_response({"msg":"This Planet has been already added to favorites"}),404
     
 
 @app.route('/favorites/<int:id_user>/people/<int:id_people>',methods=['POST'])
 def post_user_favorite_people(id_user,id_people):
     db.session.query(User).get_or_404(id_user,f'There is no user with id "{id_user}"')
     db.session.query(People).get_or_404(id_people,f'There is no Planet with id "{id_people}"')
+    # duplicates are rejected by the uq_favorite_user_people index
     try:
-        query_favorite = db.session.query(People).filter_by(user_id=id_user,people_id = id_people).first()
-        if query_favorite is not None:
-            return jsonify({"msg":"This Character has been already added to favorites"}),404
-        else:
-            favorite = Favorite(vehicle_id=None,planet_id=None,people_id = id_people, user_id =id_user)
-            db.session.add(favorite)
-            db.session.commit()
-            return jsonify({"msg":"Done"}),201
-    except SQLAlchemy as err:
-         return jsonify({"error":"There was an unexpected error","msg":str(err)})
+        favorite = Favorite(vehicle_id=None,planet_id=None,people_id = id_people, user_id =id_user)
+        db.session.add(favorite)
+        update_favorite_counts("people", {id_people: 1})
+        db.session.commit()
+        return json_response({"msg":"Done"}),201
+    except IntegrityError:
+        db.session.rollback()
+        return json_response({"msg":"This Character has been already added to favorites"}),404
 
            
 @app.route('/favorites/<int:id_user>/vehicles/<int:id_vehicle>',methods=['POST'])
 def post_user_favorite_vehicle(id_user,id_vehicle):
     db.session.query(User).get_or_404(id_user,f'There is no user with id "{id_user}"')
     db.session.query(Vehicle).get_or_404(id_vehicle,f'There is no Planet with id "{id_vehicle}"')
+    # duplicates are rejected by the uq_favorite_user_vehicle index
     try:
-        query_favorite = db.session.query(Vehicle).filter_by(user_id = id_user, vehicle_id = id_vehicle)
-        if query_favorite is not None:
-            return jsonify({"msg":"This Vehicle has been already added to favorites"}),404
-        else:
-            favorite = Favorite(people_id=None,planet_id=None,vehicle_id = id_vehicle, user_id =id_user)
-            db.session.add(favorite)
-            db.session.commit()
-            return jsonify({"msg":"Done"}),201
-    except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)})
+        favorite = Favorite(people_id=None,planet_id=None,vehicle_id = id_vehicle, user_id =id_user)
+        db.session.add(favorite)
+        update_favorite_counts("vehicles", {id_vehicle: 1})
+        db.session.commit()
+        return json_response({"msg":"Done"}),201
+    except IntegrityError:
+        db.session.rollback()
+        return json_response({"msg":"This Vehicle has been already added to favorites"}),404
           
 
 @app.route('/favorites/<int:id_user>/planets/<int:id_planet>',methods=['DELETE'])
@@ -138,13 +202,14 @@ def delete_user_favorite_planet(id_user,id_planet):
     to_delete =  db.session.query(Favorite).filter_by(user_id = id_user, planet_id = id_planet).first()      
     try:
         if to_delete is None:
-            return jsonify({"msg":"There was no element to delete"}),404
+            return json_response({"msg":"There was no element to delete"}),404
         else:
             db.session.delete(to_delete)
+            update_favorite_counts("planets", {id_planet: -1})
             db.session.commit()
-            return jsonify({"msg":"Element was deleted"}),204
+            return json_response({"msg":"Element was deleted"}),204
     except Exception as err: 
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
     
 @app.route('/favorites/<int:id_user>/people/<int:id_people>',methods=['DELETE'])
 def delete_user_favorite_people(id_user,id_people):
@@ -153,13 +218,14 @@ def delete_user_favorite_people(id_user,id_people):
     to_delete =  db.session.query(Favorite).filter_by(user_id = id_user, people_id = id_people).first()      
     try:
         if to_delete is None:
-            return jsonify({"msg":"There was no element to delete"}),404
+            return json_response({"msg":"There was no element to delete"}),404
         else:
             db.session.delete(to_delete)
+            update_favorite_counts("people", {id_people: -1})
             db.session.commit()
-            return jsonify({"msg":"Element was deleted"}),204
+            return json_response({"msg":"Element was deleted"}),204
     except Exception as err: 
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
 
 @app.route('/favorites/<int:id_user>/vehicles/<int:id_vehicle>',methods=['DELETE'])
 def delete_user_favorite_vehicle(id_user,id_vehicle):
@@ -168,57 +234,165 @@ def delete_user_favorite_vehicle(id_user,id_vehicle):
     to_delete =  db.session.query(Favorite).filter_by(user_id = id_user, vehicle_id = id_vehicle).first()      
     try:
         if to_delete is None:
-            return jsonify({"msg":"There was no element to delete"}),404
+            return json_response({"msg":"There was no element to delete"}),404
         else:
             db.session.delete(to_delete)
+            update_favorite_counts("vehicles", {id_vehicle: -1})
             db.session.commit()
-            return jsonify({"msg":"Element was deleted"}),204
+            return json_response({"msg":"Element was deleted"}),204
     except Exception as err: 
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
+
+FAVORITE_KINDS = {
+    "people": (People, People.peopleID, "people_id"),
+    "planets": (Planet, Planet.planetID, "planet_id"),
+    "vehicles": (Vehicle, Vehicle.vehicleID, "vehicle_id"),
+}
+
+def update_favorite_counts(kind, deltas):
+    # deltas maps ids to +1 or -1, one UPDATE for all of them:
+    # favorite_count + CASE id WHEN 1 THEN 1 WHEN 2 THEN -1 END.
+    # Runs in the transaction that adds or removes the favorites. The counters
+    # aren't part of the cached responses, "updated" is left as it is so the
+    # catalog snapshots aren't rebuilt either
+    model, key_column, _ = FAVORITE_KINDS[kind]
+    db.session.query(model).execution_options(invalidate_cache=False).filter(key_column.in_(deltas)).update(
+        {model.favorite_count: model.favorite_count + case(deltas, value=key_column), model.updated: model.updated},
+        synchronize_session=False)
+
+@app.route('/favorites/<int:id_user>/batch',methods=['POST'])
+def post_user_favorites_batch(id_user):
+    db.session.query(User).get_or_404(id_user,f'There is no user with id "{id_user}"')
+    operations = get_bulk_rows(app.config['BULK_MAX_ROWS'])
+    for item in operations:
+        if not isinstance(item, dict) or item.get("kind") not in FAVORITE_KINDS or item.get("op") not in ("add","remove") \
+                or not isinstance(item.get("id"), int) or isinstance(item.get("id"), bool):
+            raise APIException('Every operation needs a "kind" (people, planets or vehicles), an integer "id" and an "op" (add or remove)', status_code=400)
+
+    ids = {kind: {item["id"] for item in operations if item["kind"] == kind} for kind in FAVORITE_KINDS}
+    ids = {kind: values for kind, values in ids.items() if values}
+    # one IN query per kind to check the elements exist, and one more for the
+    # favorites the user already has among them
+    found = {kind: set(pk for (pk,) in db.session.query(FAVORITE_KINDS[kind][1]).filter(FAVORITE_KINDS[kind][1].in_(values)))
+             for kind, values in ids.items()}
+    current = {}
+    query_favorites = db.session.query(Favorite.favoriteID, Favorite.people_id, Favorite.planet_id, Favorite.vehicle_id).filter(
+        Favorite.user_id == id_user,
+        or_(*[getattr(Favorite, FAVORITE_KINDS[kind][2]).in_(values) for kind, values in ids.items()])) if ids else []
+    for favorite in query_favorites:
+        for kind, (_, _, column) in FAVORITE_KINDS.items():
+            if getattr(favorite, column) is not None:
+                current[(kind, getattr(favorite, column))] = favorite.favoriteID
+
+    # replay the operations in order, then write only the difference
+    wanted = set(current)
+    results = []
+    for index, item in enumerate(operations):
+        key = (item["kind"], item["id"])
+        if item["id"] not in found[item["kind"]]:
+            results.append({"index":index,"status":404,"msg":f'There is no element with id "{item["id"]}" in {item["kind"]}'})
+        elif item["op"] == "add" and key in wanted:
+            results.append({"index":index,"status":404,"msg":"This element has been already added to favorites"})
+        elif item["op"] == "remove" and key not in wanted:
+            results.append({"index":index,"status":404,"msg":"There was no element to delete"})
+        elif item["op"] == "add":
+            wanted.add(key)
+            results.append({"index":index,"status":201,"msg":"Done"})
+        else:
+            wanted.discard(key)
+            results.append({"index":index,"status":204,"msg":"Element was deleted"})
+
+    to_add = [{"user_id":id_user,"people_id":None,"planet_id":None,"vehicle_id":None,FAVORITE_KINDS[kind][2]:pk}
+              for (kind, pk) in wanted - set(current)]
+    to_delete = [current[key] for key in set(current) - wanted]
+    try:
+        if to_add:
+            # Core insert: one executemany, the ORM would split the rows by the columns set
+            db.session.execute(insert(Favorite.__table__), to_add)
+        if to_delete:
+            db.session.query(Favorite).filter(Favorite.favoriteID.in_(to_delete)).delete(synchronize_session=False)
+        deltas = {kind: {} for kind in FAVORITE_KINDS}
+        for (kind, pk) in wanted - set(current):
+            deltas[kind][pk] = 1
+        for (kind, pk) in set(current) - wanted:
+            deltas[kind][pk] = -1
+        for kind, kind_deltas in deltas.items():
+            if kind_deltas:
+                update_favorite_counts(kind, kind_deltas)
+        db.session.commit()
+    except IntegrityError as err:
+        db.session.rollback()
+        return json_response({"error":"The favorites changed while saving, nothing was saved","msg":str(err.orig)}),409
+    return json_response({"added":len(to_add),"removed":len(to_delete),"results":results}),200
+
+@app.route('/popular',methods=['GET'])
+def get_popular():
+    kinds = request.args.get('type', ','.join(FAVORITE_KINDS)).split(',')
+    if any(kind not in FAVORITE_KINDS for kind in kinds):
+        raise APIException('Unknown type', status_code=400, payload={"valid_types": list(FAVORITE_KINDS)})
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    if limit < 1:
+        raise APIException('"limit" must be a positive integer', status_code=400)
+    result = {}
+    for kind in kinds:
+        model, key_column, _ = FAVORITE_KINDS[kind]
+        keys = model.serialized_keys()
+        columns = [getattr(model, model.serialized_fields[key]) for key in keys]
+        # the top K is read backwards from the (favorite_count, id) index
+        rows = db.session.execute(select(*columns, model.favorite_count).where(model.favorite_count > 0)
+                                  .order_by(model.favorite_count.desc(), key_column.desc()).limit(limit)).all()
+        result[kind] = Rows(keys + ["favorite_count"], rows)
+    return json_response(result),200
 
 """ PEOPLE ENDPOINTS """
 
 @app.route('/people', methods=['GET'])
+@conditional(catalog_version(People))
+@cached('people', snapshot_db_version(People))
 def get_all_people():
-    query_result = People.query.all()
-    try:
-     if query_result == None:
-         return jsonify({"msg":"There are no characters in the list"}),404
-     else: 
-        result = list(map(lambda item: item.serialize(),query_result))     
-        return jsonify(result), 200  
-        
-    except Exception as err:
-        return ({"error":"There was an unexpected error","msg":str(err)})
-    
+    return catalog_response(People, People.peopleID),200
+
 @app.route('/people/<int:id>',methods=['GET'])
+@conditional(catalog_version(People))
+@cached('people', snapshot_db_version(People))
 def get_specific_people(id):
-    query_people = People.query.get_or_404(id,f'There was no Character with id "{id}"')    
-    result = query_people.serialize()   
-    return jsonify(result),200
+    fields = get_fields(People)
+    snapshot = get_snapshot(People)
+    if snapshot is not None:
+        return snapshot.detail_response(id, fields, f'There was no Character with id "{id}"'),200
+    query_people = load_fields(People.query, People, fields).get_or_404(id,f'There was no Character with id "{id}"')
+    result = query_people.serialize(fields)
+    response = json_response(result)
+    response.last_modified = query_people.last_modified
+    return response,200
     
 @app.route('/people',methods=['POST'])
 def post_new_people():
     data = request.get_json()       
-    required = {"name","birth_year","eye_color","gender","hair_color","height","mass","skin_color","homeworld"}
+    required = People.required_fields
 
     for item in required:
         if item not in data or not data[item]:
-            return jsonify({"msg":"All fields are required! Check if one or more are empty!"}),400
+            return json_response({"msg":"All fields are required! Check if one or more are empty!"}),400
 
     try:
         name = request.json.get("name")  
         query_people = db.session.query(People).filter_by(name = name).first()
         if query_people is not None:
-            return jsonify({"msg":"Character with the same name already exists"}),400
+            return json_response({"msg":"Character with the same name already exists"}),400
         else:
             new_character = People( name = data["name"], birth_year = data["birth_year"],eye_color = data["eye_color"], gender = data["gender"], hair_color = data["hair_color"], height = data["height"], mass = data["mass"], skin_color = data["skin_color"],homeworld = data["homeworld"])
             db.session.add(new_character)
             db.session.commit()
-            return jsonify({"msg":"New Character was added successfully"}),201
+            return json_response({"msg":"New Character was added successfully"}),201
 
-    except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)})
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
+
+@app.route('/people/bulk',methods=['POST'])
+def post_bulk_people():
+    return bulk_create(People)
 
 """ @app.route('/people/<int:id_planet>',methods=['POST'])
 def put_specific_people(id_planet):
@@ -231,9 +405,9 @@ def put_specific_people(id_planet):
             if item in data and data[item]:
                 query_people[item] = data[item]
                 db.session.commit()
-        return jsonify({"msg":" Character was moded successfully"}),200       
+        return json_response({"msg":" Character was moded successfully"}),200       
     except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}) """
+        return json_response({"error":"There was an unexpected error","msg":str(err)}) """
 
 
 
@@ -241,97 +415,164 @@ def put_specific_people(id_planet):
 
 
 @app.route('/planets',methods=['GET'])
+@conditional(catalog_version(Planet))
+@cached('planets', snapshot_db_version(Planet))
 def get_all_planets():
     """ query_planets2 =  Planet.query.all() """
     """ SON EQUIVALENTES """
-    query_planets = db.session.query(Planet).all()  
+    return catalog_response(Planet, Planet.planetID),200
 
-    try:
-        if query_planets == None:
-            return jsonify({"msg":"There are no planets registered yet"}),404
-        else: 
-            result = list(map(lambda item: item.serialize(),query_planets))
-            return jsonify(result),200
-    except Exception as err:
-        return jsonify({"error":"There was an unexpected error","error":str(err)}),500
-    
-   
 @app.route('/planets/<int:id>',methods=['GET'])
+@conditional(catalog_version(Planet))
+@cached('planets', snapshot_db_version(Planet))
 def get_specific_planet(id):
-    query_planet = db.session.query(Planet).get_or_404(id,f'Sorry there is no planet with id "{id}" registered')
-    result = query_planet.serialize()
-    return jsonify(result),200
+    fields = get_fields(Planet)
+    snapshot = get_snapshot(Planet)
+    if snapshot is not None:
+        return snapshot.detail_response(id, fields, f'Sorry there is no planet with id "{id}" registered'),200
+    query_planet = load_fields(db.session.query(Planet), Planet, fields).get_or_404(id,f'Sorry there is no planet with id "{id}" registered')
+    result = query_planet.serialize(fields)
+    response = json_response(result)
+    response.last_modified = query_planet.last_modified
+    return response,200
 
 @app.route('/planets',methods=['POST'])
 def post_new_planet():
     data = request.get_json()       
-    required = {"name","diameter","rotation_period","orbital_period","gravity","population","climate","terrain","surface_water"}
+    required = Planet.required_fields
 
     for item in required:
         if item not in data or not data[item]:
-            return jsonify({"msg":"All fields are required! Check if one or more are empty!"}),400
+            return json_response({"msg":"All fields are required! Check if one or more are empty!"}),400
 
     try:
         name = request.json.get("name")  
         query_planet = db.session.query(Planet).filter_by(name = name).first()
         if query_planet is not None:
-            return jsonify({"msg":"Character with the same name already exists"}),400
+            return json_response({"msg":"Character with the same name already exists"}),400
         else:
             new_planet = Planet( name = data["name"], diameter = data["diameter"],rotation_period = data["rotation_period"], orbital_period = data["orbital_period"], gravity = data["gravity"], population = data["population"], climate = data["climate"], terrain = data["terrain"],surface_water = data["surface_water"])
             db.session.add(new_planet)
             db.session.commit()
-            return jsonify({"msg":"New Planet was added successfully"}),201
+            return json_response({"msg":"New Planet was added successfully"}),201
+
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
 
-    except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)})
+
+@app.route('/planets/bulk',methods=['POST'])
+def post_bulk_planets():
+    return bulk_create(Planet)
 
 
 
 """ VEHICLE ENDPOINTS """
 
 @app.route('/vehicles',methods=['GET'])
+@conditional(catalog_version(Vehicle))
+@cached('vehicles', snapshot_db_version(Vehicle))
 def get_all_vehicles():
-    query_vehicles = db.session.query(Vehicle).all()
-    try:
-        if query_vehicles == None:
-            return jsonify({"msg":"There are no vehicles registered yet"}),404
-        else: 
-            result = list(map(lambda item: item.serialize(),query_vehicles))
-            return jsonify(result),200
-    except Exception as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)}),500
+    return catalog_response(Vehicle, Vehicle.vehicleID),200
 
 @app.route('/vehicles/<int:vehicle_id>',methods=['GET'])
+@conditional(catalog_version(Vehicle))
+@cached('vehicles', snapshot_db_version(Vehicle))
 def get_specific_vehicle(vehicle_id):
-    query_vehicle = db.session.query(Vehicle).get_or_error_404(vehicle_id,f'There was no Vehicle with id "{vehicle_id}"')
-    result = query_vehicle.serialize()
-    return jsonify(result),200
+    fields = get_fields(Vehicle)
+    snapshot = get_snapshot(Vehicle)
+    if snapshot is not None:
+        return snapshot.detail_response(vehicle_id, fields, f'There was no Vehicle with id "{vehicle_id}"'),200
+    query_vehicle = load_fields(db.session.query(Vehicle), Vehicle, fields).get_or_404(vehicle_id,f'There was no Vehicle with id "{vehicle_id}"')
+    result = query_vehicle.serialize(fields)
+    response = json_response(result)
+    response.last_modified = query_vehicle.last_modified
+    return response,200
 
 
 @app.route('/vehicles',methods=['POST'])
 def post_new_vehicle():
     data = request.get_json()       
-    required = {"name","model","vehicle_class","manufacturer","lenght","cost_credits","max_speed","cargo_capacity","consumable"}
+    required = Vehicle.required_fields
 
     for item in required:
         if item not in data or not data[item]:
-            return jsonify({"msg":"All fields are required! Check if one or more are empty!"}),400
+            return json_response({"msg":"All fields are required! Check if one or more are empty!"}),400
 
     try:
         name = request.json.get("name")  
         query_vehicle = db.session.query(Vehicle).filter_by(name = name).first()
         if query_vehicle is not None:
-            return jsonify({"msg":"Vehicle with the same name already exists"}),400
+            return json_response({"msg":"Vehicle with the same name already exists"}),400
         else:
             new_vehicle = Vehicle( name = data["name"], model = data["model"], vehicle_class= data["vehicle_class"], manufacturer = data["manufacturer"], lenght = data["lenght"], cost_credits = data["cost_credits"], max_speed = data["max_speed"], cargo_capacity = data["cargo_capacity"],consumable = data["consumable"])
             db.session.add(new_vehicle)
             db.session.commit()
-            return jsonify({"msg":"New Vehicle was added successfully"}),201
+            return json_response({"msg":"New Vehicle was added successfully"}),201
 
-    except SQLAlchemy as err:
-        return jsonify({"error":"There was an unexpected error","msg":str(err)})
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
+
+
+
+@app.route('/vehicles/bulk',methods=['POST'])
+def post_bulk_vehicles():
+    return bulk_create(Vehicle)
+
+
+""" SEARCH ENDPOINT """
+
+@app.route('/search',methods=['GET'])
+def get_search():
+    term = request.args.get('q', '').strip()
+    if not term:
+        raise APIException('The "q" parameter is required', status_code=400)
+    limit = get_page_size()
+    # results are ranked, so the cursor is the offset of the next page
+    offset = decode_cursor(request.args['after']) if request.args.get('after') else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise APIException('Invalid pagination cursor', status_code=400)
+    results = search(term, limit + 1, offset)
+    next_cursor = encode_cursor(offset + limit) if len(results) > limit else None
+    return page_response(results[:limit], next_cursor),200
 
 
+""" BULK INSERTS """
+
+def bulk_create(model):
+    rows = get_bulk_rows(app.config['BULK_MAX_ROWS'])
+    names = {item.get("name") for item in rows if isinstance(item, dict) and isinstance(item.get("name"), str)}
+    # one query finds every name that is already taken
+    taken = set(name for (name,) in db.session.query(model.name).filter(model.name.in_(names))) if names else set()
+
+    results = []
+    new_rows = []
+    for index, item in enumerate(rows):
+        if not isinstance(item, dict) or any(not item.get(field) for field in model.required_fields) or not isinstance(item["name"], str):
+            results.append({"index":index,"status":400,"msg":"All fields are required! Check if one or more are empty!"})
+        elif any(not isinstance(item[field], (str, int, float)) for field in model.required_fields):
+            results.append({"index":index,"status":400,"msg":"Every field must be a string or a number"})
+        elif item["name"] in taken:
+            results.append({"index":index,"status":400,"msg":"An element with the same name already exists"})
+        else:
+            taken.add(item["name"])
+            new_rows.append({field: str(item[field]) for field in model.required_fields})
+            results.append({"index":index,"status":201,"msg":"Created"})
+
+    if not new_rows:
+        return json_response({"created":0,"results":results}),400
+    try:
+        # a single executemany INSERT inside one transaction
+        db.session.execute(insert(model), new_rows)
+        db.session.commit()
+    except IntegrityError as err:
+        db.session.rollback()
+        return json_response({"error":"Another request added some of these elements, nothing was saved","msg":str(err.orig)}),409
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        return json_response({"error":"There was an unexpected error","msg":str(err)}),500
+    return json_response({"created":len(new_rows),"results":results}),201
 
 
 
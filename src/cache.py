@@ -0,0 +1,263 @@
+"""
+Response cache for the read-mostly catalog endpoints (people, planets and vehicles).
+
+The JSON body of every cached GET is stored per resource and per url (so every
+page and every query string gets its own entry) together with its ETag and
+Last-Modified, so a cache hit can answer 304 without touching the database. The
+compressed variants (gzip, br, zstd) are stored next to it under their own key, so
+a hit doesn't compress the body again. Every commit that inserts, updates or
+deletes people, planets or vehicles calls invalidate(resource) (see the session
+events at the end of this module, they cover the API, the admin and the flask
+commands), which bumps the resource version: entries stored under an older
+version are never read again and fall out of the cache on their own. Statements
+run with the execution option invalidate_cache=False, like the favorite
+counters that aren't part of any response, leave the cache alone.
+
+By default every process keeps its own LRU cache, so with several gunicorn workers
+a write is only seen right away by the worker that handled it. The catalog routes
+also key their entries with the version of the table their snapshot saw in the
+database (see snapshot.py), so the other workers follow within
+SNAPSHOT_CHECK_SECONDS; without snapshots they catch up once their entries
+expire (CACHE_TTL). Point CACHE_URL to a redis server to
+share one cache between all the workers (needs `pipenv install redis`), or set it
+to "none" to disable caching.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_app_context, request, Response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from werkzeug.http import http_date, parse_date
+from models import People, Planet, Vehicle
+from utils import wants_stream
+from metrics import count_cache
+from compression import accepted_encoding, choose_encoding, compress_response
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# models whose responses are cached -> resource
+CACHED_MODELS = {People: 'people', Planet: 'planets', Vehicle: 'vehicles'}
+
+
+class LocalCache:
+    """In-process LRU cache with a time to live per entry and a max size in bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def version(self, name):
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def incr_version(self, name):
+        # versions live outside of the LRU so they can never be evicted
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class RedisCache:
+    """Cache stored in redis, shared by every worker.
+
+    Any client with the get/setex/incr methods of redis.Redis works, which makes it
+    easy to swap the server for an in-memory stand in.
+    """
+
+    def __init__(self, client, prefix='api-cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, ttl, value)
+
+    def version(self, name):
+        return int(self.client.get(self.prefix + 'version:' + name) or 0)
+
+    def incr_version(self, name):
+        return self.client.incr(self.prefix + 'version:' + name)
+
+
+def setup_cache(app):
+    url = os.environ.get('CACHE_URL', 'local')
+    app.config.setdefault('CACHE_TTL', int(os.environ.get('CACHE_TTL', DEFAULT_TTL)))
+    if url == 'none':
+        backend = None
+    elif url == 'local':
+        backend = LocalCache(int(os.environ.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)))
+    else:
+        import redis
+        backend = RedisCache(redis.Redis.from_url(url))
+    app.extensions['response_cache'] = backend
+    # bumped by every commit of this process, with or without a cache backend
+    app.extensions['resource_versions'] = {}
+    return backend
+
+
+def pack(response):
+    # two header lines: the ETag and Last-Modified, then the Vary header
+    last_modified = http_date(response.last_modified) if response.last_modified else ''
+    header = '{} {}\n{}\n'.format(response.get_etag()[0], last_modified, response.headers.get('Vary', ''))
+    return header.encode() + response.get_data()
+
+
+def unpack(entry, encoding=None):
+    header, vary, body = entry.split(b'\n', 2)
+    etag, last_modified = header.decode().split(' ', 1)
+    response = Response(body, status=200, mimetype='application/json')
+    if vary:
+        response.headers['Vary'] = vary.decode()
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.last_modified = parse_date(last_modified)
+    return response
+
+
+def get_backend():
+    return current_app.extensions.get('response_cache')
+
+
+def invalidate(resource):
+    versions = current_app.extensions['resource_versions']
+    versions[resource] = versions.get(resource, 0) + 1
+    backend = get_backend()
+    if backend is not None:
+        backend.incr_version(resource)
+
+
+def resource_version(resource):
+    """Changes with every write of this process, and of every worker when the backend is shared (redis)."""
+    backend = get_backend()
+    return (current_app.extensions['resource_versions'].get(resource, 0),
+            backend.version(resource) if backend is not None else None)
+
+
+def cached(resource, data_version=None):
+    """Cache the JSON body of a successful GET, keyed by the full url.
+
+    data_version returns the version of the data in the database (or None), it
+    is part of the key so writes of other processes are seen too.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None or wants_stream():
+                return view(*args, **kwargs)
+
+            version = backend.version(resource)
+            current = data_version() if data_version is not None else None
+            if current is not None:
+                version = '{}-{}'.format(version, '-'.join(map(str, current)))
+            key = '{}:{}:{}'.format(resource, version, request.url)
+            encoding = accepted_encoding()
+            if encoding is not None:
+                entry = backend.get('{}:{}:{}:{}'.format(resource, version, encoding, request.url))
+                if entry is not None:
+                    count_cache(resource, True)
+                    return unpack(entry, encoding)
+
+            entry = backend.get(key)
+            count_cache(resource, entry is not None)
+            if entry is not None:
+                response = unpack(entry)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or not response.is_json:
+                    return response
+                response.add_etag()
+                backend.set(key, pack(response), current_app.config['CACHE_TTL'])
+
+            # store the compressed variant too, small bodies are sent uncompressed
+            if encoding is not None and choose_encoding(response) == encoding:
+                response = compress_response(response, encoding)
+                backend.set('{}:{}:{}:{}'.format(resource, version, encoding, request.url), pack(response),
+                            current_app.config['CACHE_TTL'])
+            return response
+        return wrapper
+    return decorator
+
+
+""" INVALIDATION ON COMMIT """
+
+def changes_response(instance):
+    # updates of columns that aren't serialized (favorite_count) don't matter
+    state = inspect(instance)
+    return any(state.attrs[attribute].history.has_changes() for attribute in instance.serialized_fields.values())
+
+
+def record_flush(session, flush_context):
+    changed = session.info.setdefault('invalidate', set())
+    for instance in list(session.new) + list(session.deleted):
+        if type(instance) in CACHED_MODELS:
+            changed.add(CACHED_MODELS[type(instance)])
+    for instance in session.dirty:
+        if type(instance) in CACHED_MODELS and changes_response(instance):
+            changed.add(CACHED_MODELS[type(instance)])
+
+
+def record_statement(orm_execute_state):
+    # insert(People) executemany, query(...).update() and .delete() skip the flush
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in CACHED_MODELS \
+            and orm_execute_state.execution_options.get('invalidate_cache', True):
+        orm_execute_state.session.info.setdefault('invalidate', set()).add(CACHED_MODELS[mapper.class_])
+
+
+def invalidate_committed(session):
+    resources = session.info.pop('invalidate', ())
+    if resources and has_app_context():
+        for resource in resources:
+            invalidate(resource)
+
+
+def forget_rolled_back(session):
+    session.info.pop('invalidate', None)
+
+
+# listening on the Session class covers the flask-sqlalchemy session and any
+# other session created later
+if not event.contains(Session, 'after_commit', invalidate_committed):
+    event.listen(Session, 'after_flush', record_flush)
+    event.listen(Session, 'do_orm_execute', record_statement)
+    event.listen(Session, 'after_commit', invalidate_committed)
+    event.listen(Session, 'after_rollback', forget_rolled_back)
@@ -0,0 +1,195 @@
+"""
+flask commands, next to the ones of flask-migrate (flask db ...):
+
+    $ pipenv run flask import-data people data/people.json
+    $ pipenv run flask import-data vehicles data/vehicles.csv --chunk-size 10000
+    $ pipenv run flask reconcile-favorites
+
+import-data loads people, planets or vehicles from a JSON array (or a SWAPI page,
+an object with a "results" array), an NDJSON file or a CSV file with a header. The
+file is read and written in chunks, so it can be bigger than the memory. Every row
+needs the same fields as POST /people, /planets or /vehicles (the SWAPI names of
+the vehicle fields are accepted too), rows with a missing field or a name that
+already exists are skipped and reported.
+
+Chunks are written with COPY on postgres (psycopg2) and with one executemany
+INSERT on other databases, every chunk in its own transaction.
+
+reconcile-favorites recounts the favorites of every person, planet and vehicle,
+fixing the favorite_count columns if a favorite was changed without going through
+the API (from the admin or by hand in the database).
+"""
+import csv
+import io
+import json
+import os
+import time
+import click
+from sqlalchemy import func, insert, select, update
+from models import db, People, Planet, Vehicle, Favorite
+from cache import invalidate
+
+RESOURCES = {'people': People, 'planets': Planet, 'vehicles': Vehicle}
+# model, primary key and the favorite column pointing to it, for the counters
+COUNTED = {'people': (People, People.peopleID, Favorite.people_id),
+           'planets': (Planet, Planet.planetID, Favorite.planet_id),
+           'vehicles': (Vehicle, Vehicle.vehicleID, Favorite.vehicle_id)}
+# SWAPI field name -> column, for the fields named differently in our models
+SWAPI_FIELDS = {'length': 'lenght', 'cost_in_credits': 'cost_credits',
+                'max_atmosphering_speed': 'max_speed', 'consumables': 'consumable'}
+BLOCK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(BLOCK_SIZE)
+    if not buffer.lstrip().startswith('['):
+        # a single object (a SWAPI page) is small enough to be read at once
+        document = json.loads(buffer + file.read())
+        yield from document.get('results', [document]) if isinstance(document, dict) else [document]
+        return
+    # a JSON array is decoded one element at a time, reading more of the file
+    # every time an element doesn't fit in the buffer
+    position = buffer.index('[') + 1
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            if position == len(buffer):
+                raise ValueError('end of the buffer')
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            more = file.read(BLOCK_SIZE)
+            if not more:
+                raise click.ClickException('The JSON file ends in the middle of an element')
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        yield item
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+READERS = {'json': read_json, 'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean_rows(model, items, first_index, seen, errors):
+    """Rows of the chunk ready to be inserted, the others are added to errors."""
+    items = [{SWAPI_FIELDS.get(key, key): value for key, value in item.items()} if isinstance(item, dict) else item
+             for item in items]
+    names = {item.get('name') for item in items if isinstance(item, dict) and isinstance(item.get('name'), str)}
+    # one query per chunk finds the names that are already taken
+    taken = set(name for (name,) in db.session.query(model.name).filter(model.name.in_(names))) if names else set()
+    rows = []
+    for index, item in enumerate(items, first_index):
+        if not isinstance(item, dict) or any(not item.get(field) for field in model.required_fields):
+            errors.append((index, 'All fields are required! Check if one or more are empty!'))
+        elif not isinstance(item['name'], str):
+            errors.append((index, 'The name must be a string'))
+        elif item['name'] in taken or item['name'] in seen:
+            errors.append((index, 'An element with the same name already exists'))
+        else:
+            seen.add(item['name'])
+            rows.append({field: str(item[field]) for field in model.required_fields})
+    return rows
+
+
+def copy_rows(model, rows):
+    data = io.StringIO()
+    csv.writer(data).writerows([row[field] for field in model.required_fields] for row in rows)
+    data.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    columns = ', '.join('"{}"'.format(field) for field in model.required_fields)
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(model.__table__.name, columns), data)
+
+
+def write_rows(model, rows):
+    if db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2':
+        copy_rows(model, rows)
+    else:
+        db.session.execute(insert(model), rows)
+    db.session.commit()
+
+
+def reconcile_favorite_counts(model, key_column, favorite_column):
+    """Fix the favorite_count of every row in one UPDATE, returns the number of rows fixed."""
+    counted = select(func.count(Favorite.favoriteID)).where(favorite_column == key_column).scalar_subquery()
+    result = db.session.execute(update(model).where(model.favorite_count != counted)
+                                .values(favorite_count=counted, updated=model.updated),
+                                execution_options={'synchronize_session': False, 'invalidate_cache': False})
+    return result.rowcount
+
+
+def setup_commands(app):
+
+    @app.cli.command('import-data')
+    @click.argument('resource', type=click.Choice(sorted(RESOURCES)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(sorted(READERS)),
+                  help='Format of the file, by default taken from its extension.')
+    @click.option('--chunk-size', default=5000, show_default=True, help='Rows written per transaction.')
+    def import_data(resource, path, file_format, chunk_size):
+        """Import people, planets or vehicles from a JSON, NDJSON or CSV file."""
+        model = RESOURCES[resource]
+        file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise click.BadParameter('use --format to choose json, ndjson or csv', param_hint='--format')
+
+        imported = 0
+        read = 0
+        errors = []
+        seen = set()
+        start = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as file:
+            try:
+                for chunk in chunks(READERS[file_format](file), chunk_size):
+                    rows = clean_rows(model, chunk, read, seen, errors)
+                    read += len(chunk)
+                    if rows:
+                        write_rows(model, rows)
+                        imported += len(rows)
+                    click.echo('{} rows read, {} imported ({:.0f} rows/s)'.format(
+                        read, imported, imported / (time.perf_counter() - start)), err=True)
+            except ValueError as err:
+                raise click.ClickException('Could not read the file after row {}: {}'.format(read, err))
+        # COPY writes through the raw connection, the session doesn't see it
+        invalidate(resource)
+
+        for index, msg in errors[:MAX_REPORTED_ERRORS]:
+            click.echo('row {}: {}'.format(index + 1, msg), err=True)
+        if len(errors) > MAX_REPORTED_ERRORS:
+            click.echo('... and {} more rows skipped'.format(len(errors) - MAX_REPORTED_ERRORS), err=True)
+        elapsed = time.perf_counter() - start
+        click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/s), {} rows skipped'.format(
+            imported, resource, elapsed, imported / elapsed if elapsed else 0, len(errors)))
+
+    @app.cli.command('reconcile-favorites')
+    def reconcile_favorites():
+        """Rebuild the favorite_count of people, planets and vehicles from the favorites."""
+        for resource, (model, key_column, favorite_column) in COUNTED.items():
+            start = time.perf_counter()
+            fixed = reconcile_favorite_counts(model, key_column, favorite_column)
+            db.session.commit()
+            click.echo('{}: {} counters fixed in {:.1f}s'.format(resource, fixed, time.perf_counter() - start))
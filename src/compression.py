@@ -0,0 +1,129 @@
+"""
+Response compression negotiated with the Accept-Encoding header.
+
+gzip is always available, brotli and zstd (both in the Pipfile) are used when
+installed and preferred in that order when the client accepts several of them. Only JSON and text bodies of at least
+COMPRESS_MIN_SIZE bytes (default 500) are compressed, smaller ones would barely
+shrink. COMPRESS_GZIP_LEVEL, COMPRESS_BR_LEVEL and COMPRESS_ZSTD_LEVEL set the
+levels (defaults 6, 4 and 3), COMPRESS=0 turns compression off.
+
+Streamed bodies (the NDJSON collections) are gzipped on the fly as the rows are
+written, whatever their size, when the client accepts gzip.
+
+Every representation has its own ETag: the hash of the uncompressed body with the
+encoding appended ("<hash>-gzip"), so If-None-Match keeps working for every
+variant. The cached endpoints store their compressed variants in the response
+cache (see cache.py), so hot pages aren't compressed again on every request.
+"""
+import gzip
+import os
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MIN_SIZE = 500
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain'}
+
+
+def gzip_compress(data, level):
+    # mtime=0 makes the output depend on the body only
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def brotli_compress(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# encoding -> (compress function, config key of its level), by order of preference
+ENCODERS = {
+    'br': (brotli_compress, 'COMPRESS_BR_LEVEL'),
+    'zstd': (zstd_compress, 'COMPRESS_ZSTD_LEVEL'),
+    'gzip': (gzip_compress, 'COMPRESS_GZIP_LEVEL'),
+}
+AVAILABLE = [encoding for encoding, module in (('br', brotli), ('zstd', zstandard), ('gzip', gzip)) if module is not None]
+
+
+def setup_compression(app):
+    app.config.setdefault('COMPRESS', os.getenv('COMPRESS', '1').lower() in ('1', 'true'))
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)))
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', int(os.getenv('COMPRESS_GZIP_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BR_LEVEL', int(os.getenv('COMPRESS_BR_LEVEL', 4)))
+    app.config.setdefault('COMPRESS_ZSTD_LEVEL', int(os.getenv('COMPRESS_ZSTD_LEVEL', 3)))
+
+
+def is_compressible(response):
+    return current_app.config['COMPRESS'] and response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def accepted_encoding():
+    """The best encoding the client accepts, None for uncompressed responses."""
+    if not current_app.config['COMPRESS']:
+        return None
+    return request.accept_encodings.best_match(AVAILABLE)
+
+
+def choose_encoding(response):
+    """The encoding to send this response with, None to send it as it is."""
+    if not is_compressible(response) or response.is_streamed or 'Content-Encoding' in response.headers \
+            or response.status_code in (204, 206, 304):
+        return None
+    if response.content_length is None or response.content_length < current_app.config['COMPRESS_MIN_SIZE']:
+        return None
+    return accepted_encoding()
+
+
+def gzip_stream(chunks, level):
+    # wbits=31 writes the gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_stream(response):
+    if response.status_code != 200 or 'Content-Encoding' in response.headers \
+            or not request.accept_encodings['gzip']:
+        return response
+    response.response = gzip_stream(response.response, current_app.config['COMPRESS_GZIP_LEVEL'])
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers.pop('Content-Length', None)
+    return response
+
+
+def compress_response(response, encoding=None):
+    if is_compressible(response):
+        # the response changes with Accept-Encoding even when it isn't compressed
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed and encoding is None:
+            return compress_stream(response)
+    encoding = encoding or choose_encoding(response)
+    if encoding is None:
+        return response
+    if request.method in ('GET', 'HEAD') and response.status_code == 200 and response.get_etag()[0] is None:
+        response.add_etag()
+    compress, level = ENCODERS[encoding]
+    response.set_data(compress(response.get_data(), current_app.config[level]))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag('{}-{}'.format(etag, encoding), weak)
+    return response
@@ -0,0 +1,50 @@
+"""
+Engine and connection pool settings, read from the environment.
+
+    DB_POOL_SIZE          connections kept open by every process (default 5)
+    DB_MAX_OVERFLOW       extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE       seconds after which a connection is replaced (default 1800)
+    DB_POOL_PRE_PING      check connections before using them (default 1)
+    DB_STATEMENT_TIMEOUT  postgres statement_timeout in milliseconds (default: none)
+    DB_NULL_POOL          set to 1 when an external pooler such as PgBouncer
+                          already pools the connections: every request opens and
+                          closes its own connection (default 0)
+
+Remember that every gunicorn worker has its own pool, so the database has to
+accept workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+"""
+import os
+from sqlalchemy.pool import NullPool
+
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url):
+    options = {
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "1"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+    if env_flag("DB_NULL_POOL", "0"):
+        options["poolclass"] = NullPool
+    elif not database_url.startswith("sqlite"):
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+        options["pool_timeout"] = int(os.getenv("DB_POOL_TIMEOUT", 30))
+
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT")
+    if statement_timeout and database_url.startswith("postgresql"):
+        options["connect_args"] = {"options": "-c statement_timeout={}".format(int(statement_timeout))}
+    return options
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    # NullPool and the sqlite pools don't keep these counters
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
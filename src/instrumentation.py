@@ -0,0 +1,81 @@
+"""
+Per-request timing and SQL query counting.
+
+Every query run through SQLAlchemy is timed by the engine events below and added
+to the counters of the current request. The response gets a Server-Timing header
+with the total time, the database time and the number of queries (shown by the
+browser dev tools), and the log gets a warning for
+
+    - every query slower than SLOW_QUERY_MS milliseconds (default 200)
+    - every request running more than QUERY_COUNT_WARN queries (default 10),
+      usually a relationship loaded once per row (N+1 queries)
+"""
+import os
+import time
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_QUERY_COUNT_WARN = 10
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    count_query(time.perf_counter() - conn.info['query_start'].pop(), statement)
+
+
+def handle_error(exception_context):
+    # after_cursor_execute doesn't run for a failed statement: its start time
+    # is removed here, and the query counted all the same
+    conn = exception_context.connection
+    if conn is None or not conn.info.get('query_start'):
+        return
+    count_query(time.perf_counter() - conn.info['query_start'].pop(), exception_context.statement)
+
+
+def count_query(elapsed, statement):
+    # queries run outside of a request (flask shell, migrations) aren't counted
+    if not has_app_context() or 'query_count' not in g:
+        return
+    g.query_count += 1
+    g.query_time += elapsed
+    if elapsed * 1000 > current_app.config['SLOW_QUERY_MS']:
+        current_app.logger.warning('slow query (%.1f ms) in %s: %s', elapsed * 1000, request.endpoint, statement)
+
+
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.query_count = 0
+    g.query_time = 0.0
+
+
+def add_server_timing(response):
+    if 'request_start' not in g:
+        return response
+    total = (time.perf_counter() - g.request_start) * 1000
+    response.headers.add('Server-Timing', 'app;dur={:.1f}, db;dur={:.1f};desc="{} queries"'.format(
+        total, g.query_time * 1000, g.query_count))
+    if g.query_count > current_app.config['QUERY_COUNT_WARN']:
+        current_app.logger.warning('%s ran %d queries (%.1f ms), probably N+1 queries: %s %s',
+                                   request.endpoint, g.query_count, g.query_time * 1000,
+                                   request.method, request.full_path.rstrip('?'))
+    return response
+
+
+def setup_instrumentation(app):
+    app.config.setdefault('SLOW_QUERY_MS', float(os.getenv('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)))
+    app.config.setdefault('QUERY_COUNT_WARN', int(os.getenv('QUERY_COUNT_WARN', DEFAULT_QUERY_COUNT_WARN)))
+    app.before_request(start_timer)
+    app.after_request(add_server_timing)
+
+
+# listening on the Engine class covers every engine, including the ones created
+# after this module is imported
+if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', handle_error)
@@ -0,0 +1,117 @@
+"""
+Prometheus metrics, served in the text format at GET /metrics.
+
+prometheus-client is installed by the Pipfile, without it the endpoint is not added.
+
+    http_requests_total                 requests by endpoint, method and status
+    http_request_duration_seconds       latency histogram by endpoint, method and status
+    http_response_size_bytes            body size histogram by endpoint
+    db_pool_connections                 open database connections
+    db_pool_checked_out_connections     connections in use by a request
+    cache_requests_total                response cache lookups by resource, hit or miss
+
+Endpoints are labelled with their Flask endpoint name (get_all_people,
+post_user_favorite_planet...), never with the url, so ids don't create new series.
+
+With several gunicorn workers every worker writes its values to the directory in
+PROMETHEUS_MULTIPROC_DIR and /metrics adds them up, whichever worker answers.
+gunicorn.conf.py sets it to a new temporary directory when it isn't set, it has to
+be set before this module is imported.
+"""
+import os
+import time
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, \
+        CONTENT_TYPE_LATEST, generate_latest, multiprocess
+except ImportError:
+    multiprocess = None
+
+if multiprocess is not None:
+    REQUESTS = Counter('http_requests_total', 'HTTP requests', ['endpoint', 'method', 'status'])
+    LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method', 'status'],
+                        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+    RESPONSE_SIZE = Histogram('http_response_size_bytes', 'HTTP response body size', ['endpoint'],
+                              buckets=(100, 1000, 10000, 100000, 1000000, 10000000))
+    POOL_CONNECTIONS = Gauge('db_pool_connections', 'Open database connections', multiprocess_mode='livesum')
+    POOL_CHECKED_OUT = Gauge('db_pool_checked_out_connections', 'Database connections in use',
+                             multiprocess_mode='livesum')
+    CACHE_REQUESTS = Counter('cache_requests_total', 'Response cache lookups', ['resource', 'result'])
+
+
+def count_cache(resource, hit):
+    if multiprocess is not None:
+        CACHE_REQUESTS.labels(resource, 'hit' if hit else 'miss').inc()
+
+
+def start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def observe_request(response):
+    if 'metrics_start' not in g:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    status = str(response.status_code)
+    REQUESTS.labels(endpoint, request.method, status).inc()
+    LATENCY.labels(endpoint, request.method, status).observe(time.perf_counter() - g.metrics_start)
+    # the size of streamed responses isn't known here
+    if response.content_length is not None:
+        RESPONSE_SIZE.labels(endpoint).observe(response.content_length)
+    return response
+
+
+def get_metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    response = Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def setup_metrics(app):
+    if multiprocess is None:
+        return
+    app.before_request(start_timer)
+    app.after_request(observe_request)
+    app.add_url_rule('/metrics', 'get_metrics', get_metrics, methods=['GET'])
+
+    if not event.contains(Pool, 'connect', on_connect):
+        event.listen(Pool, 'connect', on_connect)
+        event.listen(Pool, 'close', on_close)
+        event.listen(Pool, 'close_detached', on_close_detached)
+        event.listen(Pool, 'checkout', on_checkout)
+        event.listen(Pool, 'checkin', on_checkin)
+
+
+def worker_exit(pid):
+    """Called by gunicorn when a worker is gone, drops its live gauges."""
+    if multiprocess is not None and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def on_connect(dbapi_connection, connection_record):
+    POOL_CONNECTIONS.inc()
+
+
+def on_close(dbapi_connection, connection_record):
+    POOL_CONNECTIONS.dec()
+
+
+def on_close_detached(dbapi_connection):
+    POOL_CONNECTIONS.dec()
+
+
+def on_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKED_OUT.inc()
+
+
+def on_checkin(dbapi_connection, connection_record):
+    # also called for connections invalidated while checked out
+    POOL_CHECKED_OUT.dec()
@@ -1,13 +1,36 @@
+import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
 
-""" import datetime 
-
-now = datetime.datetime.now(datetime.timezone.utc) """
+def utcnow():
+    # set from python, the microseconds tell apart two updates in the same second
+    return datetime.datetime.now(datetime.timezone.utc)
 
 db = SQLAlchemy()
 
-class User(db.Model):    
+class Serializer:
+    # maps every key of the JSON output to the model attribute it comes from,
+    # so a subset of the keys can be serialized and loaded from the database
+    serialized_fields = {}
+
+    def serialize(self, fields=None):
+        return {key: getattr(self, attribute) for key, attribute in self.serialized_fields.items()
+                if fields is None or key in fields}
+
+    @classmethod
+    def serialized_keys(cls, fields=None):
+        return [key for key in cls.serialized_fields if fields is None or key in fields]
+
+    # Last-Modified of a row: its last update, or its creation when never updated
+    @property
+    def last_modified(self):
+        return self.updated or self.created
+
+    @classmethod
+    def last_modified_column(cls):
+        return func.coalesce(cls.updated, cls.created)
+
+class User(Serializer, db.Model):    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120),unique=True,nullable=False)
     fullname = db.Column(db.String(120),nullable=False)
@@ -15,21 +38,29 @@ class User(db.Model):
     password = db.Column(db.String(80),  nullable=False)
     is_active = db.Column(db.Boolean(),  nullable=False)
     created = db.Column(db.DateTime(timezone=True),server_default=func.now(),nullable=True)
+    updated = db.Column(db.DateTime(timezone=True),onupdate=utcnow,nullable=True)
     favorite = db.relationship('Favorite',backref="user",lazy=True)
 
     def __repr__(self):
         return '<User %r>' % self.id
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "username":self.username,
-            "email": self.email,
-            "created_at": self.created,            
-            # do not serialize the password, its a security breach
-        }
+    serialized_fields = {
+        "id": "id",
+        "username":"username",
+        "email": "email",
+        "created_at": "created",
+        # do not serialize the password, its a security breach
+    }
     
-class Planet(db.Model):
+class Planet(Serializer, db.Model):
+    # indexes for the filters clients use the most, ending with the primary key
+    # so a filtered and sorted page is still a single index range scan
+    __table_args__ = (
+        db.Index('ix_planet_climate','climate','planetID'),
+        db.Index('ix_planet_terrain','terrain','planetID'),
+        db.Index('ix_planet_favorite_count','favorite_count','planetID'),
+    )
+
     planetID=db.Column(db.Integer,primary_key=True)
     name = db.Column(db.String(120),unique=True,nullable=False)
     diameter = db.Column(db.String(120),nullable=False)
@@ -40,29 +71,39 @@ class Planet(db.Model):
     climate = db.Column(db.String(120),nullable=False)
     terrain = db.Column(db.String(120),nullable=False)
     surface_water = db.Column(db.String(120),nullable=False)
+    # kept up to date by the favorites endpoints, `flask reconcile-favorites` rebuilds it
+    favorite_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
     created = db.Column(db.DateTime(timezone=True),server_default=func.now(),nullable=True)
+    updated = db.Column(db.DateTime(timezone=True),onupdate=utcnow,nullable=True)
     favorite = db.relationship('Favorite',backref='planet',lazy=True)
 
+    required_fields = ("name","diameter","rotation_period","orbital_period","gravity","population","climate","terrain","surface_water")
+
         
     def __repr__(self):
         return '<Planet %r>' % self.planetID
 
-    def serialize(self):
-        return {
-            "id": self.planetID,
-            "name":self.name,
-            "diameter":self.diameter,
-            "rotation_period":self.rotation_period,
-            "orbital_period":self.orbital_period,
-            "gravity":self.gravity,
-            "population":self.population,
-            "climate":self.climate,
-            "terrain":self.terrain,
-            "surface_water":self.surface_water,                
-            
-        }
-
-class Vehicle(db.Model):
+    serialized_fields = {
+        "id": "planetID",
+        "name":"name",
+        "diameter":"diameter",
+        "rotation_period":"rotation_period",
+        "orbital_period":"orbital_period",
+        "gravity":"gravity",
+        "population":"population",
+        "climate":"climate",
+        "terrain":"terrain",
+        "surface_water":"surface_water",
+    }
+
+class Vehicle(Serializer, db.Model):
+    __table_args__ = (
+        db.Index('ix_vehicle_name','name','vehicleID'),
+        db.Index('ix_vehicle_manufacturer','manufacturer','vehicleID'),
+        db.Index('ix_vehicle_vehicle_class','vehicle_class','vehicleID'),
+        db.Index('ix_vehicle_favorite_count','favorite_count','vehicleID'),
+    )
+
     vehicleID = db.Column(db.Integer,primary_key=True)
     name = db.Column(db.String(120),nullable=False)
     model = db.Column(db.String(120),nullable=False)
@@ -73,29 +114,38 @@ class Vehicle(db.Model):
     max_speed = db.Column(db.String(120),nullable=False)
     cargo_capacity = db.Column(db.String(120),nullable=False)
     consumable = db.Column(db.String(120),nullable=False)    
+    favorite_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
     created=db.Column(db.DateTime(timezone=True),server_default=func.now(),nullable=True)
+    updated = db.Column(db.DateTime(timezone=True),onupdate=utcnow,nullable=True)
     favorite = db.relationship('Favorite',backref='vehicle',lazy=True)
 
+    required_fields = ("name","model","vehicle_class","manufacturer","lenght","cost_credits","max_speed","cargo_capacity","consumable")
+
     
     def __repr__(self):
-        return '<Vehicle %r>' % self.vehicleId
-
-    def serialize(self):
-        return {
-            "id": self.vehicleId,
-            "name":self.name,
-            "model":self.model,
-            "vehicle_class":self.vehicle_class,
-            "manufacturer":self.manufacturer,
-            "lenght":self.lenght,
-            "cost_credits": self.cost_credits,
-            "max_speed": self.max_speed,
-            "cargo_capacity":self.cargo_capacity,
-            "consumable":self.consumable,                       
-            # do not serialize the password, its a security breach
-        }
+        return '<Vehicle %r>' % self.vehicleID
+
+    serialized_fields = {
+        "id": "vehicleID",
+        "name":"name",
+        "model":"model",
+        "vehicle_class":"vehicle_class",
+        "manufacturer":"manufacturer",
+        "lenght":"lenght",
+        "cost_credits": "cost_credits",
+        "max_speed": "max_speed",
+        "cargo_capacity":"cargo_capacity",
+        "consumable":"consumable",
+        # do not serialize the password, its a security breach
+    }
   
-class People(db.Model):
+class People(Serializer, db.Model):
+    __table_args__ = (
+        db.Index('ix_people_gender','gender','peopleID'),
+        db.Index('ix_people_homeworld','homeworld','peopleID'),
+        db.Index('ix_people_favorite_count','favorite_count','peopleID'),
+    )
+
     peopleID = db.Column(db.Integer,primary_key=True)
     name = db.Column(db.String(120),unique=True,nullable=False)
     birth_year = db.Column(db.String(120),nullable=False)
@@ -106,28 +156,43 @@ class People(db.Model):
     mass = db.Column(db.String(120),nullable=False)
     skin_color = db.Column(db.String(120),nullable=False)
     homeworld = db.Column(db.String(120),nullable=False)    
+    favorite_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
     created = db.Column(db.DateTime(timezone=True),server_default=func.now(),nullable=True)
+    updated = db.Column(db.DateTime(timezone=True),onupdate=utcnow,nullable=True)
     favorite = db.relationship('Favorite',backref='people',lazy=True)
 
+    required_fields = ("name","birth_year","eye_color","gender","hair_color","height","mass","skin_color","homeworld")
+
     def __repr__(self):
         return '<People %r>' % self.peopleID
 
-    def serialize(self):
-        return {
-            "id": self.peopleID,
-            "name":self.name,
-            "birth_year":self.birth_year,
-            "eye_color":self.eye_color,
-            "gender":self.gender,
-            "hair_color":self.hair_color,
-            "height":self.height,
-            "mass":self.mass,
-            "skin_color":self.skin_color,
-            "homeworld":self.homeworld,                             
-            # do not serialize the password, its a security breach
-        }
-
-class Favorite(db.Model):
+    serialized_fields = {
+        "id": "peopleID",
+        "name":"name",
+        "birth_year":"birth_year",
+        "eye_color":"eye_color",
+        "gender":"gender",
+        "hair_color":"hair_color",
+        "height":"height",
+        "mass":"mass",
+        "skin_color":"skin_color",
+        "homeworld":"homeworld",
+        # do not serialize the password, its a security breach
+    }
+
+class Favorite(Serializer, db.Model):
+    # every favorites endpoint looks rows up by user and by (user, item), the
+    # partial unique indexes also let the database reject duplicated favorites
+    __table_args__ = (
+        db.Index('ix_favorite_user_id','user_id'),
+        db.Index('uq_favorite_user_people','user_id','people_id',unique=True,
+                 postgresql_where=db.text('people_id IS NOT NULL'),sqlite_where=db.text('people_id IS NOT NULL')),
+        db.Index('uq_favorite_user_planet','user_id','planet_id',unique=True,
+                 postgresql_where=db.text('planet_id IS NOT NULL'),sqlite_where=db.text('planet_id IS NOT NULL')),
+        db.Index('uq_favorite_user_vehicle','user_id','vehicle_id',unique=True,
+                 postgresql_where=db.text('vehicle_id IS NOT NULL'),sqlite_where=db.text('vehicle_id IS NOT NULL')),
+    )
+
     favoriteID = db.Column(db.Integer,primary_key=True)
     people_id = db.Column(db.Integer,db.ForeignKey('people.peopleID'),nullable=True)
     vehicle_id = db.Column(db.Integer,db.ForeignKey('vehicle.vehicleID'),nullable=True)
@@ -137,15 +202,14 @@ class Favorite(db.Model):
     def __repr__(self):
         return '<Favorite %r>' % self.favoriteID
 
-    def serialize(self):
-        return {
-            "id": self.favoriteID,
-            "people_id":self.people_id,
-            "vehicle_id":self.vehicle_id,
-            "planet_id":self.planet_id,
-            "user_id": self.user_id                                      
-            # do not serialize the password, its a security breach
-        }
+    serialized_fields = {
+        "id": "favoriteID",
+        "people_id":"people_id",
+        "vehicle_id":"vehicle_id",
+        "planet_id":"planet_id",
+        "user_id": "user_id"
+        # do not serialize the password, its a security breach
+    }
 
 
 
@@ -0,0 +1,91 @@
+"""
+Name search across people, planets and vehicles.
+
+On postgres the names are indexed with pg_trgm (GIN trigram indexes), which serve
+the ILIKE '%term%' lookups and rank the matches by similarity. On sqlite every name
+is copied into the "search_index" FTS5 table by triggers and matched by word prefix,
+ranked with bm25. Both indexes are created by the migrations, and by db.create_all()
+through the after_create listener at the bottom of this file.
+"""
+import re
+from sqlalchemy import event, func, literal, select, text, union_all
+from models import db, People, Planet, Vehicle
+
+# the number is used to build a unique rowid for the sqlite FTS table
+SEARCHABLE = (
+    ('people', 1, People, People.peopleID),
+    ('planets', 2, Planet, Planet.planetID),
+    ('vehicles', 3, Vehicle, Vehicle.vehicleID),
+)
+
+
+def search(term, limit, offset):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return search_fts(term, limit, offset)
+    return search_like(term, limit, offset, ranked=dialect == 'postgresql')
+
+
+def search_fts(term, limit, offset):
+    words = re.findall(r'\w+', term)
+    if not words:
+        return []
+    # every word has to match the beginning of a word of the name
+    match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+    rows = db.session.execute(text(
+        'SELECT kind, ref_id, name FROM search_index WHERE search_index MATCH :match '
+        'ORDER BY bm25(search_index), kind, ref_id LIMIT :limit OFFSET :offset'),
+        {"match": match, "limit": limit, "offset": offset})
+    return [{"type": kind, "id": ref_id, "name": name} for kind, ref_id, name in rows]
+
+
+def search_like(term, limit, offset, ranked):
+    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    queries = []
+    for kind, _, model, key_column in SEARCHABLE:
+        score = func.similarity(model.name, term) if ranked else literal(0)
+        queries.append(select(literal(kind).label('type'), key_column.label('id'), model.name.label('name'), score.label('score'))
+                       .where(model.name.ilike(pattern, escape='\\')))
+    matches = union_all(*queries).subquery()
+    rows = db.session.execute(select(matches.c.type, matches.c.id, matches.c.name)
+                              .order_by(matches.c.score.desc(), matches.c.name, matches.c.type, matches.c.id)
+                              .limit(limit).offset(offset))
+    return [{"type": kind, "id": ref_id, "name": name} for kind, ref_id, name in rows]
+
+
+def create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for _, _, model, _ in SEARCHABLE:
+            table = model.__tablename__
+            connection.execute(text(
+                'CREATE INDEX IF NOT EXISTS ix_{0}_name_trgm ON {0} USING gin (name gin_trgm_ops)'.format(table)))
+    elif connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(name, kind UNINDEXED, ref_id UNINDEXED)"))
+        for kind, number, model, key_column in SEARCHABLE:
+            table = model.__tablename__
+            key = '"{}"'.format(key_column.key)
+            rowid = '{{0}}.{} * 4 + {}'.format(key, number)
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS {0}_search_insert AFTER INSERT ON {0} BEGIN "
+                "INSERT INTO search_index(rowid, name, kind, ref_id) VALUES ({1}, new.name, '{2}', new.{3}); END"
+                .format(table, rowid.format('new'), kind, key)))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS {0}_search_update AFTER UPDATE OF name ON {0} BEGIN "
+                "UPDATE search_index SET name = new.name WHERE rowid = {1}; END"
+                .format(table, rowid.format('new'))))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS {0}_search_delete AFTER DELETE ON {0} BEGIN "
+                "DELETE FROM search_index WHERE rowid = {1}; END"
+                .format(table, rowid.format('old'))))
+
+
+def drop_search_index(target, connection, **kw):
+    # the trigram indexes and the triggers are dropped together with their tables
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+
+event.listen(db.metadata, 'after_create', create_search_index)
+event.listen(db.metadata, 'after_drop', drop_search_index)
@@ -0,0 +1,115 @@
+"""
+JSON encoding for every API response.
+
+orjson is used when it is installed (it is in the Pipfile), the standard library
+json module otherwise. Both produce the same bytes as flask.jsonify: compact, keys
+sorted, dates formatted as HTTP dates and non ASCII characters escaped as \\uXXXX,
+so the bodies and their ETags don't change with orjson.
+
+Query results can be encoded from plain tuples with Rows, so the list endpoints
+don't need to build one dict per row.
+"""
+import datetime
+import json
+import re
+from json.encoder import encode_basestring_ascii
+from flask import Response
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NON_ASCII = re.compile('[^\x00-\x7f]')
+
+
+def default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return http_date(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def escape_non_ascii(match):
+    # same escapes as json.dumps with ensure_ascii: \u00e9, surrogate pairs
+    # above the basic plane
+    code = ord(match.group())
+    if code > 0xffff:
+        code -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xd800 | code >> 10, 0xdc00 | code & 0x3ff)
+    return '\\u{:04x}'.format(code)
+
+
+def dumps(value):
+    if orjson is not None:
+        data = orjson.dumps(value, default=default,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        # orjson writes UTF-8, non ASCII characters (only found inside strings)
+        # are escaped so the body doesn't depend on orjson being installed
+        if data.isascii():
+            return data
+        return NON_ASCII.sub(escape_non_ascii, data.decode()).encode()
+    return json.dumps(value, default=default, sort_keys=True, separators=(',', ':')).encode()
+
+
+def encode_value(value):
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    return dumps(value).decode()
+
+
+class Rows:
+    """Tuples from a query, encoded as a JSON array of objects with the given keys."""
+
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, keys, rows):
+        self.keys = tuple(keys)
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def encode(self):
+        if not self.rows:
+            return b'[]'
+        if orjson is not None:
+            keys = self.keys
+            return dumps([dict(zip(keys, row)) for row in self.rows])
+        # keys are written in sorted order like every other response. The text
+        # around the values ('{"id":%s,"name":%s}') is the same for every row
+        order = sorted(range(len(self.keys)), key=lambda index: self.keys[index])
+        template = '{' + ','.join(encode_basestring_ascii(self.keys[index]).replace('%', '%%') + ':%s' for index in order) + '}'
+        # pick the encoder of every column from the first row, a row that does
+        # not fit (a null string for example) goes through encode_value
+        encoders = [encode_basestring_ascii if isinstance(self.rows[0][index], str) else encode_value for index in order]
+        plan = list(zip(encoders, order))
+        objects = []
+        for row in self.rows:
+            try:
+                objects.append(template % tuple([encoder(row[index]) for encoder, index in plan]))
+            except TypeError:
+                objects.append(template % tuple([encode_value(row[index]) for index in order]))
+        return ('[' + ','.join(objects) + ']').encode()
+
+
+def encode(value):
+    if isinstance(value, Rows):
+        return value.encode()
+    if isinstance(value, dict) and any(isinstance(item, Rows) for item in value.values()):
+        # objects holding Rows are put together by hand so the rows are encoded once
+        parts = [encode_basestring_ascii(str(key)) + ':' + encode(value[key]).decode() for key in sorted(value)]
+        return ('{' + ','.join(parts) + '}').encode()
+    return dumps(value)
+
+
+def json_response(value, status=200):
+    return Response(encode(value), status=status, mimetype='application/json')
@@ -0,0 +1,179 @@
+"""
+In-memory copy of the catalog tables (people, planets and vehicles).
+
+Every process loads each table once into a snapshot: one tuple of serialized
+values per row in a dict keyed by the primary key, plus the sorted primary keys
+for pagination. The detail endpoints, the plain list endpoints (only ?limit=
+and ?after=) and ?ids= are answered from it without a query; filtered, sorted,
+?fields= and streamed lists still go to the database.
+
+The rows of a snapshot are never changed: a new one is built and swapped in when
+
+    - the resource version changed: every commit writing the table calls
+      cache.invalidate(), which bumps it in this process (even without a
+      response cache) and, with redis, right away for every worker
+    - the row count, last id, last created or last updated date in the
+      database changed, checked at most every SNAPSHOT_CHECK_SECONDS (default 5).
+      "updated" is set by the models on every ORM update, rows changed with raw
+      SQL have to set it too to be seen
+
+Tables with more than SNAPSHOT_MAX_ROWS rows (default 100000) aren't kept in
+memory. Set CATALOG_SNAPSHOT=0 to turn the snapshots off.
+"""
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from flask import abort, current_app, request
+from sqlalchemy import func, select
+from models import db, People, Planet, Vehicle
+from cache import resource_version
+from serializer import Rows, json_response
+from utils import APIException, collection_response, decode_cursor, encode_cursor, get_ids, get_page_size, \
+    multi_get_response, page_response, wants_stream
+
+DEFAULT_CHECK_SECONDS = 5
+DEFAULT_MAX_ROWS = 100000
+# query string arguments a list request can have and still be served from memory
+SNAPSHOT_ARGS = {'limit', 'after'}
+
+
+class Snapshot:
+    """The rows of one table at one point in time, they are never modified once loaded."""
+
+    __slots__ = ('keys', 'ids', 'rows', 'db_version', 'cache_version', 'checked')
+
+    def __init__(self, keys, ids, rows, db_version, cache_version):
+        self.keys = keys
+        self.ids = ids
+        self.rows = rows
+        self.db_version = db_version
+        self.cache_version = cache_version
+        self.checked = time.monotonic()
+
+    def detail_response(self, id, fields, message):
+        row = self.rows.get(id)
+        if row is None:
+            abort(404, description=message)
+        response = json_response({key: value for key, value in zip(self.keys, row) if fields is None or key in fields})
+        response.last_modified = row[-1]
+        return response
+
+    def page_response(self):
+        limit = get_page_size()
+        start = 0
+        if request.args.get('after'):
+            cursor = decode_cursor(request.args['after'])
+            if not isinstance(cursor, int):
+                raise APIException('Invalid pagination cursor', status_code=400)
+            start = bisect_right(self.ids, cursor)
+        # one extra id to know whether there is a next page
+        ids = self.ids[start:start + limit + 1]
+        rows = [self.rows[pk] for pk in ids[:limit]]
+        next_cursor = encode_cursor(ids[limit - 1]) if len(ids) > limit else None
+        dates = [row[-1] for row in rows if row[-1] is not None]
+        response = page_response(Rows(self.keys, rows), next_cursor, max(dates) if dates else None)
+        response.vary.add('Accept')
+        return response
+
+    def multi_get_response(self):
+        ids = get_ids()
+        found = {pk: self.rows[pk] for pk in ids if pk in self.rows}
+        dates = [row[-1] for row in found.values() if row[-1] is not None]
+        return multi_get_response(self.keys, found, ids, max(dates) if dates else None)
+
+
+class Catalog:
+    """Keeps the current snapshot of a table and replaces it when the table changes."""
+
+    def __init__(self, model, key_column, resource):
+        self.model = model
+        self.key_column = key_column
+        self.resource = resource
+        self.snapshot = None
+        self.too_big = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        cache_version = resource_version(self.resource)
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.cache_version == cache_version \
+                and time.monotonic() - snapshot.checked < current_app.config['SNAPSHOT_CHECK_SECONDS']:
+            return snapshot
+        if self.too_big is not None and time.monotonic() - self.too_big < current_app.config['SNAPSHOT_CHECK_SECONDS']:
+            return None
+        # a single thread rebuilds, the others keep using the old snapshot (or
+        # the database when there is none yet)
+        if not self._lock.acquire(blocking=False):
+            return snapshot
+        try:
+            db_version = tuple(db.session.execute(select(
+                func.count(self.key_column), func.max(self.key_column), func.max(self.model.created),
+                func.max(self.model.updated))).one())
+            if snapshot is not None and snapshot.db_version == db_version:
+                snapshot.cache_version = cache_version
+                snapshot.checked = time.monotonic()
+                return snapshot
+            if db_version[0] > current_app.config['SNAPSHOT_MAX_ROWS']:
+                self.snapshot, self.too_big = None, time.monotonic()
+                return None
+            self.snapshot, self.too_big = self.load(db_version, cache_version), None
+            return self.snapshot
+        finally:
+            self._lock.release()
+
+    def load(self, db_version, cache_version):
+        keys = tuple(self.model.serialized_keys())
+        columns = [getattr(self.model, self.model.serialized_fields[key]) for key in keys]
+        rows = {}
+        ids = array('q')
+        # every row is a plain tuple: the serialized values, then the date of its
+        # last change (Last-Modified). The strings are interned, values repeated
+        # across rows (gender, climate, homeworld...) are then stored once
+        for row in db.session.execute(select(*columns, self.model.last_modified_column(),
+                                             self.key_column.label('snapshot_key'))
+                                      .order_by(self.key_column)):
+            ids.append(row[-1])
+            rows[row[-1]] = tuple([sys.intern(value) if type(value) is str else value for value in row[:-1]])
+        return Snapshot(keys, ids, rows, db_version, cache_version)
+
+
+CATALOG = {
+    People: (People.peopleID, 'people'),
+    Planet: (Planet.planetID, 'planets'),
+    Vehicle: (Vehicle.vehicleID, 'vehicles'),
+}
+
+
+def setup_snapshots(app):
+    app.config.setdefault('CATALOG_SNAPSHOT', os.getenv('CATALOG_SNAPSHOT', '1').lower() in ('1', 'true'))
+    app.config.setdefault('SNAPSHOT_CHECK_SECONDS', float(os.getenv('SNAPSHOT_CHECK_SECONDS', DEFAULT_CHECK_SECONDS)))
+    app.config.setdefault('SNAPSHOT_MAX_ROWS', int(os.getenv('SNAPSHOT_MAX_ROWS', DEFAULT_MAX_ROWS)))
+    app.extensions['catalog_snapshots'] = {model: Catalog(model, key_column, resource)
+                                           for model, (key_column, resource) in CATALOG.items()}
+
+
+def get_snapshot(model):
+    if not current_app.config.get('CATALOG_SNAPSHOT'):
+        return None
+    return current_app.extensions['catalog_snapshots'][model].get()
+
+
+def snapshot_db_version(model):
+    """The version of the table in the database as last seen by its snapshot, None without snapshot."""
+    def version():
+        snapshot = get_snapshot(model)
+        return None if snapshot is None else snapshot.db_version
+    return version
+
+
+def catalog_response(model, key_column):
+    """A list endpoint of the catalog, from memory when the request allows it."""
+    args = request.args.keys()
+    if (args <= SNAPSHOT_ARGS or args == {'ids'}) and not wants_stream():
+        snapshot = get_snapshot(model)
+        if snapshot is not None:
+            return snapshot.multi_get_response() if 'ids' in args else snapshot.page_response()
+    return collection_response(model, key_column)
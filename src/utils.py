@@ -1,4 +1,20 @@
-from flask import jsonify, url_for
+import base64
+import json
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import load_only
+from flask import url_for, request, Response, stream_with_context
+from models import db
+from serializer import Rows, dumps, json_response
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_IDS = 500
+STREAM_BATCH_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# sorts after every other character, value <= x < value + PREFIX_END matches the prefix
+PREFIX_END = '\U0010ffff'
+# query string arguments of the list endpoints that are not filters
+RESERVED_ARGS = {'limit', 'after', 'fields', 'sort', 'stream', 'ids'}
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +31,230 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(value):
+    raw = json.dumps(value, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(raw)
+    except ValueError:
+        raise APIException('Invalid pagination cursor', status_code=400)
+
+def get_page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1:
+        raise APIException('limit must be a positive integer', status_code=400)
+    return min(limit, MAX_PAGE_SIZE)
+
+def get_column(model, field):
+    if field not in model.serialized_fields:
+        raise APIException(f'Unknown field "{field}"', status_code=400,
+                           payload={"fields": sorted(model.serialized_fields)})
+    return getattr(model, model.serialized_fields[field])
+
+def get_sort(model, key_column):
+    # ?sort=name or ?sort=-name, ties are broken by the primary key
+    value = request.args.get('sort')
+    if not value:
+        return key_column, False
+    column = get_column(model, value.lstrip('-'))
+    if column.expression.nullable:
+        raise APIException(f'The results can not be sorted by "{value.lstrip("-")}"', status_code=400)
+    return column, value.startswith('-')
+
+def filter_query(query, model):
+    # ?gender=male, ?climate__in=arid,temperate and ?name__prefix=Sky, every
+    # argument that is not a field of the model is an error
+    for arg, value in request.args.items(multi=True):
+        if arg in RESERVED_ARGS:
+            continue
+        field, _, operator = arg.partition('__')
+        column = get_column(model, field)
+        python_type = column.type.python_type
+        if python_type not in (str, int) or (operator == 'prefix' and python_type is not str):
+            raise APIException(f'The results can not be filtered with "{arg}"', status_code=400)
+        try:
+            values = [python_type(item) for item in value.split(',')] if operator == 'in' else python_type(value)
+        except ValueError:
+            raise APIException(f'Invalid value for "{arg}"', status_code=400)
+        if operator == '':
+            query = query.filter(column == values)
+        elif operator == 'in':
+            query = query.filter(column.in_(values))
+        elif operator == 'prefix':
+            # a range instead of LIKE 'value%', so the (column, primary key)
+            # indexes serve it on every database and collation
+            query = query.filter(column >= values, column < values + PREFIX_END)
+        else:
+            raise APIException(f'Unknown filter "{operator}", use "in" or "prefix"', status_code=400)
+    return query
+
+def order_query(query, key_column, sort_column, descending):
+    if sort_column is key_column:
+        return query.order_by(key_column.desc() if descending else key_column)
+    if descending:
+        return query.order_by(sort_column.desc(), key_column.desc())
+    return query.order_by(sort_column, key_column)
+
+def after_cursor(cursor, key_column, sort_column, descending):
+    # the cursor is the primary key of the last row, or [sort value, primary key]
+    # when sorting by another column
+    if sort_column is key_column:
+        if not isinstance(cursor, int):
+            raise APIException('Invalid pagination cursor', status_code=400)
+        return key_column < cursor if descending else key_column > cursor
+    if not isinstance(cursor, list) or len(cursor) != 2 or not isinstance(cursor[1], int) \
+            or type(cursor[0]) is not sort_column.type.python_type:
+        raise APIException('Invalid pagination cursor', status_code=400)
+    value, key = cursor
+    if descending:
+        return or_(sort_column < value, and_(sort_column == value, key_column < key))
+    return or_(sort_column > value, and_(sort_column == value, key_column > key))
+
+def paginate(query, key_column, sort_column=None, descending=False):
+    # keyset pagination: "WHERE key > cursor ORDER BY key LIMIT n" is an index
+    # range scan, so deep pages cost the same as the first one
+    sort_column = key_column if sort_column is None else sort_column
+    limit = get_page_size()
+    after = request.args.get('after')
+    if after:
+        query = query.filter(after_cursor(decode_cursor(after), key_column, sort_column, descending))
+    # fetch one extra row to know whether there is a next page
+    rows = db.session.execute(order_query(query, key_column, sort_column, descending).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        key = rows[-1].cursor_key
+        next_cursor = encode_cursor(key if sort_column is key_column else [rows[-1].cursor_sort, key])
+    return rows, next_cursor
+
+def get_ids():
+    # ?ids=3,1,2 asks for those rows in that order, duplicates are returned once
+    try:
+        ids = [int(item) for item in request.args.get('ids', '').split(',') if item.strip()]
+    except ValueError:
+        raise APIException('"ids" must be a comma separated list of integers', status_code=400)
+    if not ids:
+        raise APIException('"ids" must be a comma separated list of integers', status_code=400)
+    if len(ids) > MAX_IDS:
+        raise APIException(f'At most {MAX_IDS} ids can be requested at once', status_code=400)
+    if request.args.keys() - {'ids', 'fields'}:
+        raise APIException('"ids" can only be combined with "fields"', status_code=400)
+    return list(dict.fromkeys(ids))
+
+def multi_get_response(keys, found, ids, last_modified=None):
+    # found maps every id that exists to its row
+    response = json_response({
+        "results": Rows(keys, [found[pk] for pk in ids if pk in found]),
+        "missing": [pk for pk in ids if pk not in found],
+    })
+    response.last_modified = last_modified
+    return response
+
+def get_fields(model):
+    # ?fields=id,name restricts the output to those keys of the serialized model
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - model.serialized_fields.keys()
+    if unknown:
+        raise APIException('Unknown fields: ' + ', '.join(sorted(unknown)), status_code=400,
+                           payload={"fields": sorted(model.serialized_fields)})
+    return fields
+
+def load_fields(query, model, fields):
+    # SELECT only the requested columns, plus "created" and "updated" for the
+    # Last-Modified header (the primary key is always loaded)
+    if fields is None:
+        return query
+    columns = [getattr(model, model.serialized_fields[field]) for field in fields]
+    if hasattr(model, 'created'):
+        columns += [model.created, model.updated]
+    return query.options(load_only(*columns))
+
+def collection_response(model, key_column):
+    fields = get_fields(model)
+    keys = model.serialized_keys(fields)
+    sort_column, descending = get_sort(model, key_column)
+    # a Core SELECT of just the serialized columns: the rows come back as tuples
+    # and no ORM instance (identity map, instance state, relationships) is built.
+    # The serialized columns go first, then what pagination and Last-Modified need
+    query = select(*[getattr(model, model.serialized_fields[key]) for key in keys],
+                   key_column.label('cursor_key'), sort_column.label('cursor_sort'),
+                   model.last_modified_column().label('last_modified'))
+    if 'ids' in request.args:
+        # a single IN query for every requested id
+        ids = get_ids()
+        rows = db.session.execute(query.where(key_column.in_(ids))).all()
+        dates = [row.last_modified for row in rows if row.last_modified is not None]
+        return multi_get_response(keys, {row.cursor_key: row for row in rows}, ids, max(dates) if dates else None)
+    query = filter_query(query, model)
+    if wants_stream():
+        response = stream_response(order_query(query, key_column, sort_column, descending), keys)
+    else:
+        rows, next_cursor = paginate(query, key_column, sort_column, descending)
+        dates = [row.last_modified for row in rows if row.last_modified is not None]
+        response = page_response(Rows(keys, rows), next_cursor, max(dates) if dates else None)
+    # the same url answers JSON or NDJSON depending on the Accept header
+    response.vary.add('Accept')
+    return response
+
+def page_response(items, next_cursor, last_modified=None):
+    next_url = None
+    if next_cursor is not None:
+        args = dict(request.view_args or {}, **request.args.to_dict())
+        args['after'] = next_cursor
+        next_url = url_for(request.endpoint, _external=True, **args)
+    response = json_response({
+        "results": items,
+        "next": next_url,
+        "next_cursor": next_cursor,
+    })
+    response.last_modified = last_modified
+    return response
+
+def add_validators(response):
+    # strong ETag (hash of the body) on every successful GET, and a 304 without
+    # the body when If-None-Match / If-Modified-Since say the client is current
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.is_streamed:
+        return response
+    if response.get_etag()[0] is None:
+        response.add_etag()
+    return response.make_conditional(request)
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def stream_response(query, keys):
+    # one JSON document per line, written as rows come back from the database.
+    # yield_per loads the rows in batches (and uses a server side cursor on
+    # postgres) so memory stays flat no matter how big the table is
+    def generate():
+        for row in db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE)):
+            yield dumps(dict(zip(keys, row))) + b'\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def get_bulk_rows(max_rows):
+    # a JSON array, or one JSON object per line when sent as NDJSON
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            rows = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            raise APIException('Every line of the body must be a JSON object', status_code=400)
+    else:
+        rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise APIException('Expected a JSON array or an NDJSON body', status_code=400)
+    if len(rows) > max_rows:
+        raise APIException(f'At most {max_rows} records can be sent per request', status_code=413)
+    return rows
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
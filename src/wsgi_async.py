@@ -0,0 +1,43 @@
+# Entry point for the async deployment: the same app served by gevent workers, so
+# one process can keep many requests waiting on the database at the same time.
+#
+#   $ gunicorn wsgi_async --chdir ./src/ -k gevent --worker-connections 100
+#
+# gevent patches the standard library (sockets, threading) before the app is
+# imported, and psycopg2 gets a wait callback so it yields to other requests while
+# postgres works on a query instead of blocking the whole worker. Every worker
+# still uses one connection pool: set DB_POOL_SIZE + DB_MAX_OVERFLOW to the number
+# of queries a worker may run at once, the other requests wait up to DB_POOL_TIMEOUT.
+
+from gevent import monkey
+monkey.patch_all()
+
+from gevent.socket import wait_read, wait_write
+
+try:
+    from psycopg2 import extensions, OperationalError
+except ImportError:
+    extensions = None
+
+
+def gevent_wait_callback(connection, timeout=None):
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise OperationalError("Bad result from poll: %r" % state)
+
+
+if extensions is not None:
+    extensions.set_wait_callback(gevent_wait_callback)
+
+from app import app as application
+
+if __name__ == "__main__":
+    from gevent.pywsgi import WSGIServer
+    WSGIServer(('0.0.0.0', 3000), application).serve_forever()
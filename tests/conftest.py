@@ -0,0 +1,95 @@
+"""
+The app on a small seeded sqlite database, shared by every test.
+
+    $ pipenv run test
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+# after src/, bench/ has benchmark scripts named like the modules of the app
+sys.path.append(os.path.join(ROOT, 'bench'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tests.db')
+
+from app import app as flask_app
+from api import seed
+from sqlalchemy import select
+from conditional import setup_conditional
+from models import db
+from snapshot import CATALOG, setup_snapshots
+
+VOLUMES = argparse.Namespace(people=30, planets=10, vehicles=10, users=5, favorites=20)
+# the last user has no favorites, the favorite tests add and remove its own
+USER = VOLUMES.users
+MISSING = 999999
+# names of the rows created by the tests, some tables have unique names
+NAMES = itertools.count()
+
+
+class FakeRedis:
+    """In-memory stand in for redis.Redis, with the commands RedisCache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    def incr(self, key):
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+
+@pytest.fixture(scope='session')
+def app():
+    seed(flask_app, VOLUMES)
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def configure(app):
+    """configure(snapshot, cache): turn the snapshots and the response cache on or off.
+
+    Every call starts from empty snapshots, cache and ETag memo, and the
+    configuration of the app is put back after the test.
+    """
+    saved = dict(app.config), app.extensions['response_cache']
+
+    def configure(snapshot=True, cache=None):
+        app.config['CATALOG_SNAPSHOT'] = snapshot
+        app.extensions['response_cache'] = cache
+        setup_snapshots(app)
+        setup_conditional(app)
+        return cache
+
+    yield configure
+    app.config.update(saved[0])
+    configure(app.config['CATALOG_SNAPSHOT'], saved[1])
+
+
+@pytest.fixture
+def create(app, client):
+    """create(model): add a row through the API, returns its id."""
+    def create(model):
+        key_column, resource = CATALOG[model]
+        name = f'created {resource} {next(NAMES)}'
+        response = client.post('/' + resource, json={field: name for field in model.required_fields})
+        assert response.status_code == 201
+        with app.app_context():
+            return db.session.execute(select(key_column).where(model.name == name)).scalar_one()
+    return create
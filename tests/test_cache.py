@@ -0,0 +1,62 @@
+"""
+The redis response cache, on an in-memory stand in for the server: hits,
+invalidation by the commits of this process and by the ones of other workers.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event, update
+
+from conftest import FakeRedis
+from cache import RedisCache
+from models import db, utcnow, Planet
+
+
+@contextmanager
+def count_queries(app):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
+def test_hit(app, client, configure):
+    redis = FakeRedis()
+    configure(snapshot=False, cache=RedisCache(redis))
+    with count_queries(app) as statements:
+        first = client.get('/planets/1')
+    assert statements
+    assert any(key.startswith('api-cache:planets:') for key in redis.data)
+    with count_queries(app) as statements:
+        second = client.get('/planets/1')
+    assert statements == []
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+def test_commit_bumps_the_shared_version(app, client, configure, create):
+    redis = FakeRedis()
+    configure(snapshot=False, cache=RedisCache(redis))
+    client.get('/planets?limit=500')
+    id = create(Planet)
+    assert redis.data['api-cache:version:planets'] == b'1'
+    assert id in [row['id'] for row in client.get('/planets?limit=500').get_json()['results']]
+
+
+def test_write_of_another_worker(app, client, configure, create):
+    redis = FakeRedis()
+    configure(snapshot=True, cache=RedisCache(redis))
+    # the snapshot doesn't check the database by itself during the test
+    app.config['SNAPSHOT_CHECK_SECONDS'] = 3600
+    id = create(Planet)
+    client.get(f'/planets/{id}')
+    # what another worker does on commit: the row, then the shared version
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(update(Planet).where(Planet.planetID == id).values(name=f'other worker {id}', updated=utcnow()))
+    redis.incr('api-cache:version:planets')
+    assert client.get(f'/planets/{id}').get_json()['name'] == f'other worker {id}'
+    assert client.get(f'/planets?ids={id}').get_json()['results'][0]['name'] == f'other worker {id}'
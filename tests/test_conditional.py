@@ -0,0 +1,83 @@
+"""
+Conditional requests: If-None-Match and If-Modified-Since answered with 304
+while the data is the same, and with the new body once it changed. Every case
+runs on the database alone, with the snapshots and with the response cache.
+"""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from conftest import FakeRedis
+from cache import LocalCache, RedisCache
+from models import db, utcnow, People, Planet, Vehicle
+from snapshot import CATALOG
+from utils import encode_cursor
+
+CONFIGURATIONS = {
+    'database': (False, None),
+    'snapshot': (True, None),
+    'cache': (True, LocalCache),
+    'redis': (True, lambda: RedisCache(FakeRedis())),
+}
+PATHS = ('/people', '/people/1', '/people?ids=2,1', '/planets/2', '/vehicles?limit=3', '/users', '/users/2')
+
+
+@pytest.fixture(params=CONFIGURATIONS)
+def configuration(request, configure):
+    snapshot, cache = CONFIGURATIONS[request.param]
+    configure(snapshot, cache and cache())
+    return request.param
+
+
+@pytest.mark.parametrize('encoding', (None, 'gzip'))
+@pytest.mark.parametrize('path', PATHS)
+def test_if_none_match(client, configuration, path, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    # the second revalidation is answered from the remembered ETag
+    for _ in range(2):
+        revalidated = client.get(path, headers=dict(headers, **{'If-None-Match': etag}))
+        assert revalidated.status_code == 304
+        assert revalidated.headers['ETag'] == etag
+        assert revalidated.data == b''
+    other = client.get(path, headers=dict(headers, **{'If-None-Match': '"other"'}))
+    assert other.status_code == 200
+    assert other.data == response.data
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_if_modified_since(client, configuration, path):
+    response = client.get(path)
+    last_modified = response.headers['Last-Modified']
+    assert client.get(path, headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+@pytest.mark.parametrize('model', (People, Planet, Vehicle))
+def test_validators_after_update(app, client, configuration, create, model):
+    key_column, resource = CATALOG[model]
+    id = create(model)
+    # created a minute ago, the edit below then has a later Last-Modified
+    # (HTTP dates are to the second)
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(update(model).where(key_column == id).values(created=utcnow() - timedelta(minutes=1), updated=None))
+    paths = (f'/{resource}/{id}', f'/{resource}?ids={id}', f'/{resource}?after={encode_cursor(id - 1)}')
+    validators = {}
+    for path in paths:
+        response = client.get(path)
+        validators[path] = response.headers['ETag'], response.headers['Last-Modified']
+        assert client.get(path, headers={'If-None-Match': validators[path][0]}).status_code == 304
+
+    # an edit of the admin
+    with app.app_context():
+        db.session.get(model, id).name = f'updated {resource} {id}'
+        db.session.commit()
+
+    for path in paths:
+        etag, last_modified = validators[path]
+        for headers in ({'If-None-Match': etag}, {'If-Modified-Since': last_modified}):
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, headers
+            assert f'updated {resource} {id}'.encode() in response.data
@@ -0,0 +1,247 @@
+"""
+Contract of every route in src/app.py: status code and response shape.
+
+The read-only cases are generated for every resource and run with each of the
+performance layers turned on and off: the database only, the in-memory snapshot,
+the local response cache (twice, to also read the cached copy), gzip compression
+and the redis cache (twice, on a stand in for the server). Every configuration
+has to return the same status and body. The write cases run
+afterwards, in order. A route of the app without any case fails the test.
+"""
+import gzip
+import json
+import re
+
+import pytest
+
+from conftest import USER, MISSING, FakeRedis
+from app import app
+from cache import LocalCache, RedisCache
+from models import User, People, Planet, Vehicle, Favorite
+from utils import encode_cursor
+
+RESOURCES = {'people': People, 'planets': Planet, 'vehicles': Vehicle, 'users': User}
+CATALOG = ('people', 'planets', 'vehicles')
+# responses that change on every request, only their shape is compared
+VOLATILE = {'/health/db', '/metrics'}
+
+
+class Case:
+    __slots__ = ('method', 'path', 'body', 'status', 'shape')
+
+    def __init__(self, method, path, status, shape, body=None):
+        self.method = method
+        self.path = path
+        self.status = status
+        self.shape = shape
+        self.body = body
+
+    @property
+    def name(self):
+        return f'{self.method} {self.path}'
+
+
+""" SHAPES: every one returns None when the response is right, or what is wrong """
+
+def page(keys, more=None):
+    def check(response):
+        body = response.get_json()
+        if not isinstance(body, dict) or set(body) != {'results', 'next', 'next_cursor'}:
+            return f'expected a page, got {body!r:.80}'
+        if more is not None and (body['next_cursor'] is not None) != more:
+            return 'next_cursor should be ' + ('set' if more else 'null')
+        return rows(keys)(body['results'])
+    return check
+
+
+def rows(keys):
+    def check(items):
+        if not isinstance(items, list):
+            return f'expected a list, got {items!r:.80}'
+        for item in items:
+            if not isinstance(item, dict) or set(item) != set(keys):
+                return f'expected the keys {sorted(keys)}, got {item!r:.80}'
+        return None
+    return check
+
+
+def multi_get(keys, missing):
+    def check(response):
+        body = response.get_json()
+        if not isinstance(body, dict) or set(body) != {'results', 'missing'}:
+            return f'expected results and missing ids, got {body!r:.80}'
+        if body['missing'] != missing:
+            return f'expected the missing ids {missing}, got {body["missing"]}'
+        return rows(keys)(body['results'])
+    return check
+
+
+def json_list(keys):
+    return lambda response: rows(keys)(response.get_json())
+
+
+def json_object(keys):
+    def check(response):
+        body = response.get_json()
+        if not isinstance(body, dict) or set(body) != set(keys):
+            return f'expected the keys {sorted(keys)}, got {body!r:.80}'
+        return None
+    return check
+
+
+def ndjson(keys):
+    def check(response):
+        if response.mimetype != 'application/x-ndjson':
+            return f'expected NDJSON, got {response.mimetype}'
+        return rows(keys)([json.loads(line) for line in response.get_data(as_text=True).splitlines()])
+    return check
+
+
+def message(response):
+    body = response.get_json(silent=True)
+    if not isinstance(body, dict) or not ({'message', 'msg'} & set(body)):
+        return f'expected a JSON message, got {response.get_data(as_text=True)!r:.80}'
+    return None
+
+
+def mimetype(expected):
+    return lambda response: None if response.mimetype == expected else f'expected {expected}, got {response.mimetype}'
+
+
+def empty(response):
+    return None if not response.data or response.get_json(silent=True) is not None else 'unexpected body'
+
+
+""" CASES """
+
+def read_cases():
+    cases = []
+    for resource, model in RESOURCES.items():
+        keys = model.serialized_keys()
+        fields = ['id', keys[1]]
+        path = '/' + resource
+        cases += [
+            Case('GET', path, 200, page(keys)),
+            Case('GET', path + '?limit=2', 200, page(keys, more=True)),
+            Case('GET', f'{path}?limit=2&after={encode_cursor(2)}', 200, page(keys, more=True)),
+            Case('GET', f'{path}?after={encode_cursor(MISSING)}', 200, page(keys, more=False)),
+            Case('GET', f'{path}?fields={",".join(fields)}', 200, page(fields)),
+            Case('GET', f'{path}?sort=-id&limit=3', 200, page(keys, more=True)),
+            Case('GET', f'{path}?{keys[1]}__prefix=a', 200, page(keys)),
+            Case('GET', f'{path}?stream=1', 200, ndjson(keys)),
+            Case('GET', path + '?after=notacursor', 400, message),
+            Case('GET', f'{path}?sort={keys[1]}&after={encode_cursor([{"a": 1}, 1])}', 400, message),
+            Case('GET', f'{path}?sort={keys[1]}&after={encode_cursor(["a", 1])}', 200, page(keys)),
+            Case('GET', path + '?limit=0', 400, message),
+            Case('GET', path + '?fields=nope', 400, message),
+            Case('GET', path + '?nope=1', 400, message),
+            Case('GET', f'{path}?ids=3,1,{MISSING},3', 200, multi_get(keys, [MISSING])),
+            Case('GET', f'{path}?ids=2,1&fields={",".join(fields)}', 200, multi_get(fields, [])),
+            Case('GET', path + '?ids=1,x', 400, message),
+            Case('GET', path + '?ids=1&limit=2', 400, message),
+            Case('GET', path + '?ids=' + ','.join(map(str, range(1, 502))), 400, message),
+            Case('GET', path + '/1', 200, json_object(keys)),
+            Case('GET', f'{path}/2?fields={",".join(fields)}', 200, json_object(fields)),
+            Case('GET', f'{path}/{MISSING}', 404, mimetype('text/html')),
+        ]
+    favorite_keys = Favorite.serialized_keys()
+    cases += [
+        Case('GET', '/', 200, mimetype('text/html')),
+        Case('GET', '/health/db', 200, json_object(['latency_ms', 'pool', 'status'])),
+        Case('GET', '/users/favorites/1', 200, json_list(favorite_keys)),
+        Case('GET', '/users/favorites/1?expand=1', 200, json_object(CATALOG)),
+        Case('GET', '/search?q=person', 200, page(['type', 'id', 'name'])),
+        Case('GET', '/search?q=planet&limit=1', 200, page(['type', 'id', 'name'], more=True)),
+        Case('GET', '/search', 400, message),
+        Case('GET', '/popular', 200, json_object(CATALOG)),
+        Case('GET', '/popular?type=people&limit=1', 200, json_object(['people'])),
+        Case('GET', '/popular?type=nope', 400, message),
+    ]
+    if any(rule.rule == '/metrics' for rule in app.url_map.iter_rules()):
+        cases.append(Case('GET', '/metrics', 200, lambda response: None if response.mimetype == 'text/plain' else 'not text'))
+    return cases
+
+
+def write_cases():
+    cases = []
+    for resource in CATALOG:
+        model = RESOURCES[resource]
+        new = {field: f'contract {field}' for field in model.required_fields}
+        path = '/' + resource
+        cases += [
+            Case('POST', path, 201, message, new),
+            Case('POST', path, 400, message, dict(new, **{model.required_fields[1]: ''})),
+            Case('POST', path + '/bulk', 201, json_object(['created', 'results']),
+                 [{field: f'bulk {number} {field}' for field in model.required_fields} for number in range(3)]),
+            Case('POST', path + '/bulk', 400, message, {'not': 'a list'}),
+            Case('POST', path + '/bulk', 400, json_object(['created', 'results']),
+                 [dict(new, name='bulk list', **{model.required_fields[1]: ['a list']})]),
+            Case('POST', f'/favorites/{USER}/{resource}/3', 201, message),
+            Case('POST', f'/favorites/{USER}/{resource}/3', 404, message),
+            Case('POST', f'/favorites/{USER}/{resource}/{MISSING}', 404, mimetype('text/html')),
+            Case('POST', f'/favorites/{MISSING}/{resource}/3', 404, mimetype('text/html')),
+            Case('DELETE', f'/favorites/{USER}/{resource}/3', 204, empty),
+            Case('DELETE', f'/favorites/{USER}/{resource}/3', 404, message),
+        ]
+    batch = [{'kind': kind, 'id': 4, 'op': 'add'} for kind in CATALOG] + [{'kind': 'people', 'id': MISSING, 'op': 'add'}]
+    cases += [
+        Case('POST', f'/favorites/{USER}/batch', 200, json_object(['added', 'removed', 'results']), batch),
+        Case('POST', f'/favorites/{USER}/batch', 400, message, [{'kind': 'nope', 'id': 1, 'op': 'add'}]),
+        Case('POST', f'/favorites/{MISSING}/batch', 404, mimetype('text/html'), []),
+    ]
+    return cases
+
+
+def run(client, case, encoding=None):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    response = client.open(case.path, method=case.method, json=case.body, headers=headers)
+    if response.headers.get('Content-Encoding') == 'gzip':
+        response.set_data(gzip.decompress(response.get_data()))
+        del response.headers['Content-Encoding']
+    if response.status_code != case.status:
+        return response, f'expected {case.status}, got {response.status_code}: {response.get_data(as_text=True)!r:.80}'
+    return response, case.shape(response)
+
+
+READS = read_cases()
+WRITES = write_cases()
+
+
+@pytest.mark.parametrize('case', READS, ids=lambda case: case.name)
+def test_read(client, configure, case):
+    configure(snapshot=False)
+    expected, error = run(client, case)
+    assert error is None, '[database] ' + error
+    cache, redis = LocalCache(), RedisCache(FakeRedis())
+    configurations = (
+        ('snapshot', True, None, None),
+        ('cache', True, cache, None),
+        ('cache hit', True, cache, None),
+        ('gzip', True, cache, 'gzip'),
+        ('redis', True, redis, None),
+        ('redis hit', True, redis, None),
+    )
+    for name, snapshot, backend, encoding in configurations:
+        if not name.endswith(' hit'):
+            configure(snapshot, backend)
+        response, error = run(client, case, encoding)
+        assert error is None, f'[{name}] {error}'
+        # every configuration has to answer exactly like the database alone
+        if case.path not in VOLATILE:
+            assert (response.status_code, response.get_data()) == (expected.status_code, expected.get_data()), \
+                f'[{name}] the response differs from the one without snapshot, cache or compression'
+
+
+@pytest.mark.parametrize('case', WRITES, ids=lambda case: case.name)
+def test_write(client, case):
+    error = run(client, case)[1]
+    assert error is None, error
+
+
+def test_every_route_has_a_case(app):
+    route_path = lambda path: re.sub(r'<[^>]*>', '<>', re.sub(r'/\d+', '/<>', path.split('?')[0]))
+    covered = {(case.method, route_path(case.path)) for case in READS + WRITES}
+    missing = [f'{method} {rule.rule}' for rule in app.url_map.iter_rules()
+               for method in sorted(rule.methods - {'HEAD', 'OPTIONS'})
+               if not rule.rule.startswith(('/admin', '/static')) and (method, route_path(rule.rule)) not in covered]
+    assert missing == []
@@ -0,0 +1,87 @@
+"""
+Write, then read: a change has to be visible on the next request, with and
+without the snapshots and the response cache, and whether it went through the
+API, the ORM session (the admin) or another process.
+"""
+import pytest
+from sqlalchemy import insert, update
+
+from conftest import FakeRedis
+from cache import LocalCache, RedisCache
+from models import db, utcnow, People, Planet, Vehicle
+from snapshot import CATALOG
+
+CONFIGURATIONS = {
+    'database': (False, None),
+    'snapshot': (True, None),
+    'cache': (True, LocalCache),
+    'cache without snapshot': (False, LocalCache),
+    'redis': (True, lambda: RedisCache(FakeRedis())),
+    'redis without snapshot': (False, lambda: RedisCache(FakeRedis())),
+}
+MODELS = (People, Planet, Vehicle)
+
+
+@pytest.fixture(params=CONFIGURATIONS)
+def configuration(request, configure):
+    snapshot, cache = CONFIGURATIONS[request.param]
+    configure(snapshot, cache and cache())
+    return request.param
+
+
+def read(client, model, id):
+    """The name of the row in the detail, ?ids= and list responses, None where it is missing."""
+    resource = CATALOG[model][1]
+    detail = client.get(f'/{resource}/{id}')
+    ids = client.get(f'/{resource}?ids={id}').get_json()['results']
+    page = client.get(f'/{resource}?limit=500').get_json()['results']
+    return (detail.get_json()['name'] if detail.status_code == 200 else None,
+            ids[0]['name'] if ids else None,
+            next((row['name'] for row in page if row['id'] == id), None))
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_post_then_read(app, client, configuration, create, model):
+    with app.app_context():
+        next_id = db.session.execute(db.select(db.func.max(CATALOG[model][0]))).scalar() + 1
+    assert read(client, model, next_id) == (None, None, None)
+    assert create(model) == next_id
+    name = read(client, model, next_id)[0]
+    assert name is not None
+    assert read(client, model, next_id) == (name, name, name)
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_admin_update_then_read(app, client, configuration, create, model):
+    id = create(model)
+    read(client, model, id)
+    with app.app_context():
+        db.session.get(model, id).name = f'edited {id} {configuration}'
+        db.session.commit()
+    assert read(client, model, id) == (f'edited {id} {configuration}',) * 3
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_admin_delete_then_read(app, client, configuration, create, model):
+    id = create(model)
+    assert None not in read(client, model, id)
+    with app.app_context():
+        db.session.delete(db.session.get(model, id))
+        db.session.commit()
+    assert read(client, model, id) == (None, None, None)
+
+
+@pytest.mark.parametrize('model', MODELS)
+@pytest.mark.parametrize('configuration', ['snapshot', 'cache', 'redis'], indirect=True)
+def test_write_of_another_process(app, client, configuration, create, model):
+    # no commit of this process: the snapshot finds the change in the database
+    # on its next check, and the cached responses are keyed by what it found
+    app.config['SNAPSHOT_CHECK_SECONDS'] = 0
+    id = create(model)
+    read(client, model, id)
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(update(model).where(CATALOG[model][0] == id).values(name=f'raw {id}', updated=utcnow()))
+    assert read(client, model, id) == (f'raw {id}',) * 3
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(insert(model).values({field: f'raw new {id}' for field in model.required_fields}))
+    assert read(client, model, id + 1) == (f'raw new {id}',) * 3